@@ -0,0 +1,109 @@
+# File: benchmarks/bench_core.py
+# Benchmark della logica senza GUI (chronos_core) su storici sintetici di 1, 5 e 20 anni:
+# caricamento, salvataggio, timbratura, applicazione di un periodo, indice mensile del calendario,
+# analisi ed export. I tempi (minimo sui giri) si confrontano con benchmarks/baselines.json:
+# oltre la tolleranza la misura fallisce. Le soglie dipendono dalla macchina: dopo un cambio di
+# hardware (o un miglioramento voluto) vanno rigenerate con --update-baselines.
+# Uso: python benchmarks/bench_core.py [--years 1 5 20] [--repeat 3] [--tolerance 1.5] [--update-baselines]
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+from datetime import date, datetime, time, timedelta
+from time import perf_counter
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+from chronos_core import AnalyticsEngine, CalendarIndex, ChronosEngine, DataStore, DayRecord, ExcelReportGenerator
+
+BASELINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+TODAY = date(2026, 6, 15)  # data fissa: stessi storici e stessi anni caricati a ogni esecuzione
+NOISE_FLOOR = 0.005  # sotto i 5 ms di differenza non si segnala nulla
+
+def synthetic_history(years, seed=969):
+    # Giorni feriali con 4 timbrature (ingresso, pausa pranzo, uscita), più ferie, malattie e permessi
+    rng = random.Random(seed); days = {}; current = TODAY.replace(year=TODAY.year - years)
+    while current < TODAY:
+        if current.weekday() < 5:
+            roll = rng.random()
+            if roll < 0.08: record = DayRecord("Ferie", (), 0, 0)
+            elif roll < 0.10: record = DayRecord("Malattia", (), 0, 0)
+            else:
+                entry = datetime.combine(current, time(8, 0)) + timedelta(minutes=rng.randint(0, 60))
+                lunch = entry + timedelta(minutes=rng.randint(240, 300)); back = lunch + timedelta(minutes=rng.randint(30, 60))
+                leave = back + timedelta(minutes=rng.randint(200, 300)); stamps = (entry, lunch, back, leave)
+                record = DayRecord(); record.timbrature = tuple(ts.timestamp() for ts in stamps)
+                record.ore_lavorate_sec = (lunch - entry).total_seconds() + (leave - back).total_seconds()
+                if roll < 0.15: record.tipo_giornata = "Permesso"; record.ore_permesso = 2
+            days[current.strftime("%Y-%m-%d")] = record
+        current += timedelta(days=1)
+    return days
+
+def store_paths(work_dir):
+    return os.path.join(work_dir, "chronos_mobile_data"), os.path.join(work_dir, "chronos_mobile_data.json"), os.path.join(work_dir, "chronos_mobile_data.journal")
+
+def write_history(work_dir, days):
+    store = DataStore(*store_paths(work_dir)); store.open(set()); store.put_days(days); store.compact(background=False)
+
+def timed(action):
+    started = perf_counter(); result = action(); return perf_counter() - started, result
+
+def run_once(history_dir, work_dir):
+    # Ogni giro parte da una copia intatta dello storico
+    shutil.copytree(history_dir, work_dir); timings = {}
+    timings["load"], engine = timed(lambda: ChronosEngine(*store_paths(work_dir), today=TODAY))
+    timings["load_all"], all_days = timed(lambda: engine.data.range_days())
+    engine.data.dirty_years = set(engine.data.loaded_years)
+    timings["save"], _ = timed(lambda: engine.data.compact(background=False))
+    stamp_times = [datetime.combine(TODAY, time(8, 0)) + timedelta(minutes=5 * i) for i in range(20)]
+    elapsed, _ = timed(lambda: [engine.stamp(now) for now in stamp_times]); timings["stamp"] = elapsed / len(stamp_times)
+    timings["period_apply"], _ = timed(lambda: engine.update_period_data(TODAY - timedelta(days=40), TODAY - timedelta(days=10), "Ferie"))
+    calendar_index = CalendarIndex(engine.data)
+    timings["calendar_month_index"], _ = timed(lambda: [calendar_index.get_month(TODAY.year, month) for month in range(1, 13)])
+    timings["analytics"], _ = timed(lambda: AnalyticsEngine.period_totals(AnalyticsEngine.build_frame(all_days), "M"))
+    report_path = os.path.join(work_dir, "report.xlsx")
+    timings["export"], _ = timed(lambda: ExcelReportGenerator(all_days).generate_report(report_path))
+    return timings, len(all_days)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark di chronos_core su storici sintetici")
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5, 20]); parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=1.5, help="rapporto massimo rispetto alla baseline")
+    parser.add_argument("--update-baselines", action="store_true")
+    args = parser.parse_args()
+    baselines = {}
+    if os.path.exists(BASELINES_FILE):
+        with open(BASELINES_FILE, 'r', encoding='utf-8') as f: baselines = json.load(f)
+    # Import di pandas/openpyxl fuori dalle misure: il costo di avvio lo misura benchmarks/startup.py
+    AnalyticsEngine.build_frame({}); ExcelReportGenerator({})
+    results = {}; regressions = []; root = tempfile.mkdtemp(prefix="chronos_bench_")
+    try:
+        for years in args.years:
+            history_dir = os.path.join(root, f"history_{years}"); os.makedirs(history_dir); write_history(history_dir, synthetic_history(years))
+            best = {}
+            for run in range(args.repeat):
+                timings, day_count = run_once(history_dir, os.path.join(root, f"run_{years}_{run}"))
+                for metric, value in timings.items(): best[metric] = min(value, best.get(metric, value))
+            results[str(years)] = best
+            print(f"--- {years} anni ({day_count} giorni) ---")
+            for metric, value in best.items():
+                baseline = baselines.get(str(years), {}).get(metric); status = ""
+                if baseline is not None:
+                    regressed = value > baseline * args.tolerance and value - baseline > NOISE_FLOOR
+                    status = f"baseline {baseline * 1000:9.2f} ms  {'REGRESSIONE' if regressed else 'OK'}"
+                    if regressed: regressions.append(f"{years} anni / {metric}")
+                extra = f"  ({day_count / value:,.0f} giorni/s)" if metric == "export" else ""
+                print(f"{metric:22} {value * 1000:9.2f} ms  {status}{extra}")
+    finally: shutil.rmtree(root, ignore_errors=True)
+    if args.update_baselines:
+        baselines.update({years: {metric: round(value, 6) for metric, value in timings.items()} for years, timings in results.items()})
+        with open(BASELINES_FILE, 'w', encoding='utf-8') as f: json.dump(baselines, f, indent=4)
+        print(f"Baseline aggiornate in {BASELINES_FILE}"); return 0
+    if regressions: print("Regressioni: " + ", ".join(regressions)); return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
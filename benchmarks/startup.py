@@ -0,0 +1,50 @@
+# File: benchmarks/startup.py
+# Misura riproducibile dell'avvio di Chronos Mobile: import del modulo, build(), primo frame
+# e costruzione differita della pianificazione. Ogni giro parte in un processo nuovo, in una
+# cartella temporanea (con un eventuale storico copiato), così i dati reali non vengono toccati.
+# --data accetta la cartella chronos_mobile_data/ (anni separati) o il vecchio file unico, che
+# però viene migrato a ogni giro e quindi pesa sui tempi.
+# Uso: python benchmarks/startup.py [--runs 5] [--data chronos_mobile_data]
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chronos_mobile.py")
+# Soglie in secondi (mediana sui giri): superarle fa fallire la misura
+STARTUP_BUDGET = {"import": 1.5, "build": 0.5, "first_frame": 3.0, "planner": 1.0}
+
+def run_once(data_file=None):
+    work_dir = tempfile.mkdtemp(prefix="chronos_startup_")
+    try:
+        if data_file and os.path.isdir(data_file): shutil.copytree(data_file, os.path.join(work_dir, "chronos_mobile_data"))
+        elif data_file: shutil.copy(data_file, os.path.join(work_dir, "chronos_mobile_data.json"))
+        env = dict(os.environ, CHRONOS_PROFILE_STARTUP="1", KIVY_NO_ARGS="1", KIVY_NO_CONSOLELOG="1")
+        result = subprocess.run([sys.executable, APP_PATH], cwd=work_dir, env=env, capture_output=True, text=True, timeout=120)
+        for line in result.stdout.splitlines():
+            if line.startswith("CHRONOS_STARTUP "): return json.loads(line[len("CHRONOS_STARTUP "):])
+        raise RuntimeError(f"Nessuna misura dall'app (exit {result.returncode}):\n{result.stderr[-2000:]}")
+    finally: shutil.rmtree(work_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempi di avvio di Chronos Mobile")
+    parser.add_argument("--runs", type=int, default=5); parser.add_argument("--data", help="storico da usare (cartella degli anni o vecchio file unico)")
+    args = parser.parse_args()
+    runs = [run_once(args.data) for _ in range(args.runs)]
+    over_budget = []
+    for metric in list(STARTUP_BUDGET) + ["max_rss_kb"]:
+        values = [run[metric] for run in runs if metric in run]
+        if not values: continue
+        median = statistics.median(values)
+        if metric == "max_rss_kb": print(f"{metric:12} mediana {median:10.0f}"); continue
+        budget = STARTUP_BUDGET[metric]; status = "OK" if median <= budget else "OLTRE SOGLIA"
+        print(f"{metric:12} mediana {median:8.3f}s  min {min(values):8.3f}s  max {max(values):8.3f}s  soglia {budget:.2f}s  {status}")
+        if median > budget: over_budget.append(metric)
+    return 1 if over_budget else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
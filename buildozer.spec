@@ -5,6 +5,7 @@ package.name = chronos
 package.domain = com.crk969
 source.dir = .
 source.include_exts = py,png,jpg,kv,atlas
+source.exclude_dirs = benchmarks, checks
 version = 1.0
 requirements = python3,kivy==2.2.1,pandas,openpyxl,Pillow
 orientation = portrait
@@ -0,0 +1,85 @@
+# File: checks/check_import.py
+# Controlli di correttezza dell'import badge (chronos_core.BadgeImporter) su file piccoli scritti al volo:
+# date ISO con giorno <= 12 nei CSV, celle data/ora native negli XLSX, date GG/MM/AAAA, sostituzione di
+# giornate di assenza, timbrature su giornate di permesso.
+# Ogni controllo stampa OK o ERRORE; un errore fa uscire con codice 1.
+# Uso: python checks/check_import.py
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date, datetime, time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+from chronos_core import BadgeImporter, BalanceIndex, DataStore, DayRecord
+
+def imported_days(file_path):
+    importer = BadgeImporter(file_path); importer.prepare()
+    return {day: [datetime.fromtimestamp(ts).strftime("%H:%M") for ts in stamps] for day, (stamps, _) in importer.days.items()}
+
+def write_csv(work_dir, name, text):
+    file_path = os.path.join(work_dir, name)
+    with open(file_path, 'w', encoding='utf-8') as f: f.write(text)
+    return file_path
+
+def write_xlsx(work_dir, name, rows):
+    import openpyxl
+    workbook = openpyxl.Workbook(); sheet = workbook.active
+    for row in rows: sheet.append(row)
+    file_path = os.path.join(work_dir, name); workbook.save(file_path); return file_path
+
+def check_csv_iso_dates(work_dir):
+    # 2026-03-02 è il 2 marzo, non il 3 febbraio; 2026-03-13 nello stesso file resta il 13 marzo
+    file_path = write_csv(work_dir, "iso.csv", "data,ora\n2026-03-02,08:00\n2026-03-02,17:00\n2026-03-13,08:00\n2026-03-13,17:00\n")
+    return imported_days(file_path) == {"2026-03-02": ["08:00", "17:00"], "2026-03-13": ["08:00", "17:00"]}
+
+def check_csv_iso_datetime(work_dir):
+    file_path = write_csv(work_dir, "iso_datetime.csv", "timestamp\n2026-03-02 08:00\n2026-03-02T17:00:00\n")
+    return imported_days(file_path) == {"2026-03-02": ["08:00", "17:00"]}
+
+def check_csv_day_first(work_dir):
+    file_path = write_csv(work_dir, "day_first.csv", "data;ora\n02/03/2026;08:00\n02/03/2026;17:00\n")
+    return imported_days(file_path) == {"2026-03-02": ["08:00", "17:00"]}
+
+def check_xlsx_native_cells(work_dir):
+    file_path = write_xlsx(work_dir, "native.xlsx", [["Data", "Ora"], [date(2026, 3, 2), time(8, 0)], [date(2026, 3, 2), time(17, 0)]])
+    return imported_days(file_path) == {"2026-03-02": ["08:00", "17:00"]}
+
+def check_xlsx_native_datetime(work_dir):
+    file_path = write_xlsx(work_dir, "native_datetime.xlsx", [["Timestamp"], [datetime(2026, 3, 2, 8, 0)], [datetime(2026, 3, 2, 17, 0)]])
+    return imported_days(file_path) == {"2026-03-02": ["08:00", "17:00"]}
+
+def check_overwrite_absence(work_dir):
+    # "Sostituisci esistenti" su un giorno di Ferie: torna Lavorativo con l'obiettivo pieno, non credito
+    store = DataStore(os.path.join(work_dir, "data"), os.path.join(work_dir, "data.json"), os.path.join(work_dir, "data.journal")); store.open(set())
+    store.put_days({"2026-03-02": DayRecord("Ferie", (), 0, 0)})
+    importer = BadgeImporter(write_csv(work_dir, "absence.csv", "data,ora\n2026-03-02,08:00\n2026-03-02,17:00\n")); importer.prepare()
+    kept, conflicts, _ = importer.plan(store, overwrite=False); replaced, _, _ = importer.plan(store, overwrite=True); day_data = replaced.get("2026-03-02")
+    store.writer.close()
+    return not kept and len(conflicts) == 1 and day_data is not None and day_data.tipo_giornata == "Lavorativo" and day_data.obiettivo_ore == DayRecord().obiettivo_ore and day_data.eventi == DayRecord.DEFAULT_EVENTS
+
+def check_hourly_absence(work_dir):
+    # Permesso di 2 ore su 8.5 e timbrature 08:00-14:30: niente conflitto, permesso e obiettivo restano, saldo 0
+    store = DataStore(os.path.join(work_dir, "permit"), os.path.join(work_dir, "permit.json"), os.path.join(work_dir, "permit.journal")); store.open(set())
+    store.put_days({"2026-03-02": DayRecord("Permesso", DayRecord.DEFAULT_EVENTS, 8.5, 2)})
+    importer = BadgeImporter(write_csv(work_dir, "permit.csv", "data,ora\n2026-03-02,08:00\n2026-03-02,14:30\n")); importer.prepare()
+    kept, conflicts, _ = importer.plan(store, overwrite=False); replaced, _, _ = importer.plan(store, overwrite=True); store.writer.close()
+    results = [plan.get("2026-03-02") for plan in (kept, replaced)]
+    return not conflicts and all(day_data is not None and day_data.tipo_giornata == "Permesso" and day_data.ore_permesso == 2 and day_data.obiettivo_ore == 8.5 and BalanceIndex.day_balance_seconds(day_data) == 0 for day_data in results)
+
+CHECKS = [check_csv_iso_dates, check_csv_iso_datetime, check_csv_day_first, check_xlsx_native_cells, check_xlsx_native_datetime, check_overwrite_absence, check_hourly_absence]
+
+def main():
+    work_dir = tempfile.mkdtemp(prefix="chronos_check_"); failed = []
+    try:
+        for check in CHECKS:
+            try: passed = check(work_dir); detail = ""
+            except Exception as e: passed = False; detail = f" ({type(e).__name__}: {e})"
+            print(f"{check.__name__:32} {'OK' if passed else 'ERRORE'}{detail}")
+            if not passed: failed.append(check.__name__)
+    finally: shutil.rmtree(work_dir, ignore_errors=True)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+# File: checks/check_store.py
+# Controlli di correttezza dell'archivio (chronos_core.DataStore) in cartelle temporanee: replay del registro con
+# una riga troncata o con un append fallito a metà, scrittura di uno snapshot fallita (il .old resta e gli anni
+# tornano sporchi), giornate in coda al writer che sopravvivono a una compattazione, migrazione di file unico e
+# registro nel vecchio formato.
+# Ogni controllo stampa OK o ERRORE; un errore fa uscire con codice 1.
+# Uso: python checks/check_store.py
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+import chronos_core
+from chronos_core import DataJournal, DataStore, DayRecord
+
+def open_store(work_dir, years=()):
+    store = DataStore(os.path.join(work_dir, "chronos_mobile_data"), os.path.join(work_dir, "chronos_mobile_data.json"), os.path.join(work_dir, "chronos_mobile_data.journal"))
+    store.open(set(years)); return store
+
+def snapshot(store):
+    return {date_str: day_data.to_dict() for date_str, day_data in store.range_days().items()}
+
+def check_torn_trailing_record(work_dir):
+    # Ultima riga scritta a metà (app chiusa durante l'append): si scarta solo quella e il file viene accorciato
+    journal_path = os.path.join(work_dir, "torn.journal"); journal = DataJournal(journal_path)
+    journal.append({"2026-03-02": DayRecord("Ferie", (), 0, 0).to_dict()}); journal.append({"2026-03-03": DayRecord().to_dict()})
+    intact_size = os.path.getsize(journal_path)
+    with open(journal_path, 'ab') as f: f.write(b'{"2026-03-04": {"tipo_gio')
+    records = DataJournal(journal_path).replay()
+    return [list(record) for record in records] == [["2026-03-02"], ["2026-03-03"]] and os.path.getsize(journal_path) == intact_size
+
+def check_failed_append_leaves_no_partial_line(work_dir):
+    # Append fallito a metà (disco pieno all'fsync): il riprovo non deve finire dopo una riga parziale,
+    # e una riga illeggibile in mezzo al registro non deve far perdere le righe valide che la seguono
+    journal_path = os.path.join(work_dir, "partial.journal"); journal = DataJournal(journal_path)
+    journal.append({"2026-03-02": DayRecord().to_dict()}); fsync = os.fsync
+    def failing_fsync(fd): raise OSError("disco pieno")
+    os.fsync = failing_fsync
+    try: journal.append({"2026-03-03": DayRecord().to_dict()})
+    except OSError: pass
+    finally: os.fsync = fsync
+    journal.append({"2026-03-03": DayRecord().to_dict()})
+    with open(journal_path, 'ab') as f: f.write(b'{"2026-03-04": {"tipo\n')
+    journal.append({"2026-03-05": DayRecord().to_dict()})
+    return [list(record) for record in DataJournal(journal_path).replay()] == [["2026-03-02"], ["2026-03-03"], ["2026-03-05"]]
+
+def check_failed_shard_write(work_dir):
+    # Snapshot del 2025 non scritto: .old conservato, 2025 di nuovo sporco, modifica ritrovata al riavvio
+    store = open_store(work_dir); store.put_days({"2025-05-05": DayRecord("Ferie", (), 0, 0)}); store.flush()
+    write_json_atomic = chronos_core._write_json_atomic
+    def failing_write(path, payload):
+        if path.endswith("2025.json"): raise OSError("disco pieno")
+        write_json_atomic(path, payload)
+    chronos_core._write_json_atomic = failing_write
+    try: written = store.compact(background=False)
+    finally: chronos_core._write_json_atomic = write_json_atomic
+    kept = not written and os.path.exists(store.journal.rotated_path) and "2025" in store.dirty_years and store.compaction_error is not None
+    # Una compattazione successiva riuscita per un altro anno non deve perdere il 2025
+    store.put_days({"2026-05-05": DayRecord("Malattia", (), 0, 0)}); store.compact(background=False); store.writer.close()
+    reopened = open_store(work_dir)
+    return kept and reopened.get("2025-05-05").tipo_giornata == "Ferie" and reopened.get("2026-05-05").tipo_giornata == "Malattia"
+
+def check_queued_days_survive_compaction(work_dir):
+    # Giornata ancora in coda al writer e snapshot che fallisce: deve restare nel registro
+    store = open_store(work_dir); store.put_days({"2025-04-04": DayRecord("Ferie", (), 0, 0)})
+    write_json_atomic = chronos_core._write_json_atomic
+    def failing_write(path, payload): raise OSError("disco pieno")
+    chronos_core._write_json_atomic = failing_write
+    try: store.compact(background=False)
+    finally: chronos_core._write_json_atomic = write_json_atomic
+    store.writer.close(); reopened = open_store(work_dir); day_data = reopened.get("2025-04-04")
+    return day_data is not None and day_data.tipo_giornata == "Ferie"
+
+def check_legacy_migration(work_dir):
+    # File unico e registro scritti nel vecchio formato (eventi come stringa JSON, timbrature ISO)
+    stamps = [datetime(2025, 12, 30, 8, 0), datetime(2025, 12, 30, 17, 0)]
+    legacy = {
+        "2025-12-30": {"tipo_giornata": "Lavorativo", "eventi_programmati": json.dumps([["08:30", "13:00"], ["14:00", "18:30"]]), "obiettivo_ore": 8.5, "timbrature": [ts.isoformat() for ts in stamps], "ore_permesso": 0, "ore_lavorate_sec": 32400},
+        "2026-01-02": {"tipo_giornata": "Ferie", "eventi_programmati": "[]", "obiettivo_ore": 0, "timbrature": [], "ore_permesso": 0},
+    }
+    journal_line = {"2026-01-05": {"tipo_giornata": "Permesso", "eventi_programmati": json.dumps([["08:30", "12:30"]]), "obiettivo_ore": 4, "timbrature": [], "ore_permesso": 2}}
+    with open(os.path.join(work_dir, "chronos_mobile_data.json"), 'w', encoding='utf-8') as f: json.dump(legacy, f)
+    with open(os.path.join(work_dir, "chronos_mobile_data.journal"), 'w', encoding='utf-8') as f: f.write(json.dumps(journal_line) + "\n")
+    expected = {date_str: DayRecord.from_dict(raw).to_dict() for date_str, raw in {**legacy, **journal_line}.items()}
+    store = open_store(work_dir); migrated = snapshot(store); store.compact(background=False); store.writer.close()
+    shards = {}
+    for year in ("2025", "2026"):
+        with open(os.path.join(work_dir, "chronos_mobile_data", f"{year}.json"), 'r', encoding='utf-8') as f: shards.update(json.load(f))
+    legacy_kept = os.path.exists(os.path.join(work_dir, "chronos_mobile_data.json.migrated")) and not os.path.exists(os.path.join(work_dir, "chronos_mobile_data.json"))
+    return migrated == expected and shards == expected and snapshot(open_store(work_dir)) == expected and legacy_kept
+
+CHECKS = [check_torn_trailing_record, check_failed_append_leaves_no_partial_line, check_failed_shard_write, check_queued_days_survive_compaction, check_legacy_migration]
+
+def main():
+    failed = []
+    for check in CHECKS:
+        # Ogni controllo in una cartella sua: i file dell'archivio hanno nomi fissi
+        work_dir = tempfile.mkdtemp(prefix="chronos_check_")
+        try: passed = check(work_dir); detail = ""
+        except Exception as e: passed = False; detail = f" ({type(e).__name__}: {e})"
+        finally: shutil.rmtree(work_dir, ignore_errors=True)
+        print(f"{check.__name__:44} {'OK' if passed else 'ERRORE'}{detail}")
+        if not passed: failed.append(check.__name__)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,700 @@
+# File: chronos_core.py
+# Modulo: Chronos Core (logica senza interfaccia grafica)
+# Identificativo: realizzazione CRk969
+# Archivio, indici, import/export e calcoli dell'app: nessuna dipendenza da Kivy, così
+# tutto si può misurare (benchmarks/) e usare anche senza avviare la GUI.
+from datetime import datetime, timedelta, date
+import json
+import os
+import calendar
+import collections
+import contextlib
+import csv
+import functools
+import threading
+import time
+# openpyxl (e pandas) si importano solo al primo utilizzo: sul telefono pesano secondi all'avvio
+
+DAY_TYPES = ["Lavorativo", "Ferie", "Permesso", "Malattia", "Festività", "Art. 104"]
+ABSENCE_TYPES_HOURLY = ["Permesso", "Art. 104"]
+
+# --- STRUMENTAZIONE ---
+class Instrumentation:
+    # Tempi dei punti caldi (finestra mobile degli ultimi WINDOW campioni, con p50/p95) e contatori di
+    # salvataggi e byte scritti. Spenta di default: ogni punto misurato costa solo il controllo di enabled.
+    WINDOW = 200
+    def __init__(self):
+        self.enabled = bool(os.environ.get("CHRONOS_DIAGNOSTICS")); self.lock = threading.Lock(); self.samples = {}; self.counters = {}
+    def timed(self, name):
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled: return function(*args, **kwargs)
+                started = time.perf_counter()
+                try: return function(*args, **kwargs)
+                finally: self.record(name, time.perf_counter() - started)
+            return wrapper
+        return decorator
+    @contextlib.contextmanager
+    def span(self, name):
+        if not self.enabled: yield; return
+        started = time.perf_counter()
+        try: yield
+        finally: self.record(name, time.perf_counter() - started)
+    def record(self, name, seconds):
+        with self.lock:
+            if name not in self.samples: self.samples[name] = collections.deque(maxlen=self.WINDOW); self.counters[name + ".calls"] = 0
+            self.samples[name].append(seconds); self.counters[name + ".calls"] += 1
+    def count(self, name, amount=1):
+        if not self.enabled: return
+        with self.lock: self.counters[name] = self.counters.get(name, 0) + amount
+    def reset(self):
+        with self.lock: self.samples = {}; self.counters = {}
+    @staticmethod
+    def _percentile(ordered, fraction): return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    def snapshot(self):
+        with self.lock: samples = {name: sorted(values) for name, values in self.samples.items()}; counters = dict(self.counters)
+        timings = {name: {"n": len(ordered), "p50_ms": round(self._percentile(ordered, 0.5) * 1000, 3), "p95_ms": round(self._percentile(ordered, 0.95) * 1000, 3), "max_ms": round(ordered[-1] * 1000, 3)} for name, ordered in sorted(samples.items())}
+        return {"enabled": self.enabled, "generated": datetime.now().isoformat(timespec='seconds'), "timings": timings, "counters": dict(sorted(counters.items()))}
+    def dump(self, path, extra=None):
+        payload = self.snapshot(); payload.update(extra or {})
+        with open(path, 'w', encoding='utf-8') as f: json.dump(payload, f, indent=4)
+        return path
+
+INSTRUMENTS = Instrumentation()
+
+def seconds_to_hms(seconds, show_sign=False):
+    sign = "-" if seconds < 0 else "+" if show_sign else ""; seconds = int(abs(seconds))
+    h, rem = divmod(seconds, 3600); m, s = divmod(rem, 60); return f"{sign}{h:02}:{m:02}:{s:02}"
+
+# --- CLASSE EXCEL GENERATOR (ORA INCLUSA) ---
+class ExcelReportGenerator:
+    HEADERS = ["Data", "Tipo Giornata", "Obiettivo Ore", "Ore Permesso", "Ore Lavorate", "Saldo Giornaliero", "Timbrature"]
+    PROGRESS_EVERY = 50
+    SUMMARY_SHEETS = (("Mensile", "M", "Mese"), ("Settimanale", "W", "Settimana"))
+    def __init__(self, data_dict, start_date=None, end_date=None, today=None):
+        # Modalità write-only: le righe vanno dritte su disco, la memoria non cresce con gli anni esportati
+        import openpyxl
+        self.data = data_dict; self.row_count = 0; self.today_str = (today or date.today()).strftime("%Y-%m-%d")
+        self.start_str = start_date.strftime("%Y-%m-%d") if start_date else ""; self.end_str = end_date.strftime("%Y-%m-%d") if end_date else "9999-12-31"
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.ws = self.workbook.create_sheet("Riepilogo Ore")
+
+    @INSTRUMENTS.timed("export.generate_report")
+    def generate_report(self, file_path, progress_callback=None, cancel_event=None):
+        dates, max_stamps = self._select_dates()
+        if not dates: raise ValueError("Nessun dato nel periodo selezionato.")
+        self._format_sheet(max_stamps)
+        self.ws.append(self._header_row(self.ws, self.HEADERS))
+        total = len(dates)
+        for index, date_str in enumerate(dates, 1):
+            if cancel_event is not None and cancel_event.is_set(): return False
+            day_data = self.data[date_str]
+            timbrature_str = " | ".join([datetime.fromtimestamp(ts).strftime('%H:%M') for ts in day_data.timbrature])
+            worked_seconds = day_data.ore_lavorate_sec
+            target_seconds = day_data.obiettivo_ore * 3600
+            permit_seconds = day_data.ore_permesso * 3600
+            # Saldo = Lavorato + Permesso - Obiettivo
+            balance_seconds = worked_seconds + permit_seconds - target_seconds
+            
+            row = [
+                date_str,
+                day_data.tipo_giornata,
+                f"{day_data.obiettivo_ore:.2f}",
+                f"{day_data.ore_permesso:.2f}",
+                seconds_to_hms(worked_seconds),
+                seconds_to_hms(balance_seconds, show_sign=True),
+                timbrature_str
+            ]
+            self.ws.append(row); self.row_count = index
+            if progress_callback is not None and (index % self.PROGRESS_EVERY == 0 or index == total): progress_callback(index, total)
+        
+        if not self._write_summary_sheets(dates, cancel_event): return False
+        tmp_path = file_path + ".tmp"
+        self.workbook.save(tmp_path); os.replace(tmp_path, file_path)
+        return True
+
+    def _select_dates(self):
+        # Unica scansione: filtra il periodo e misura l'unica colonna a larghezza variabile (timbrature)
+        dates = []; max_stamps = 0
+        for date_str, day_data in self.data.items():
+            if self.start_str <= date_str <= self.end_str:
+                dates.append(date_str); max_stamps = max(max_stamps, len(day_data.timbrature))
+        dates.sort(); return dates, max_stamps
+
+    def _write_summary_sheets(self, dates, cancel_event=None):
+        # Fogli aggiuntivi dal motore di analisi, sugli stessi giorni del riepilogo fino a oggi: i giorni futuri
+        # sono solo pianificati e, come nei saldi dell'orologio, non entrano nei totali
+        frame = AnalyticsEngine.build_frame({date_str: self.data[date_str] for date_str in dates if date_str <= self.today_str})
+        for title, period, key_header in self.SUMMARY_SHEETS:
+            if cancel_event is not None and cancel_event.is_set(): return False
+            ws = self._create_sheet(title, [key_header, "Giorni Lavorati", "Obiettivo Ore", "Ore Permesso", "Ore Lavorate", "Saldo", "Ingresso Medio", "Uscita Media"])
+            for key, row in AnalyticsEngine.period_totals(frame, period).iterrows():
+                ws.append([key, int(row["giorni_lavorati"]), seconds_to_hms(row["obiettivo_sec"]), seconds_to_hms(row["permesso_sec"]), seconds_to_hms(row["lavorato_sec"]),
+                           seconds_to_hms(row["saldo_sec"], show_sign=True), AnalyticsEngine.format_time_of_day(row["ingresso_sec"]), AnalyticsEngine.format_time_of_day(row["uscita_sec"])])
+        absences = AnalyticsEngine.absences_by_type(frame); absence_types = [column for column in absences.columns if column != "ore_permesso"]
+        ws = self._create_sheet("Assenze", ["Anno"] + absence_types + ["Ore Permesso"])
+        for year, row in absences.iterrows(): ws.append([year] + [int(row[day_type]) for day_type in absence_types] + [f"{row['ore_permesso']:.2f}"])
+        ws = self._create_sheet("Straordinari", ["Anno"] + AnalyticsEngine.OVERTIME_BANDS)
+        for year, row in AnalyticsEngine.overtime_distribution(frame).iterrows(): ws.append([year] + [int(row[band]) for band in AnalyticsEngine.OVERTIME_BANDS])
+        return True
+
+    def _create_sheet(self, title, headers):
+        from openpyxl.utils import get_column_letter
+        ws = self.workbook.create_sheet(title)
+        for col_idx, header in enumerate(headers, 1): ws.column_dimensions[get_column_letter(col_idx)].width = max(len(header), 10) + 2
+        ws.append(self._header_row(ws, headers)); return ws
+
+    def _header_row(self, ws, headers):
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font, PatternFill
+        header_font = Font(bold=True, color="FFFFFF")
+        header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
+        row = []
+        for header in headers:
+            cell = WriteOnlyCell(ws, value=header); cell.font = header_font; cell.fill = header_fill; row.append(cell)
+        return row
+        
+    def _format_sheet(self, max_stamps):
+        # In write-only le larghezze vanno fissate prima della prima riga: i formati sono noti a priori
+        # ("YYYY-MM-DD", "+HH:MM:SS", "HH:MM | HH:MM ..."), quindi non serve rileggere le celle.
+        from openpyxl.utils import get_column_letter
+        type_width = max(len(day_type) for day_type in DAY_TYPES)
+        value_widths = [10, type_width, 6, 6, 8, 9, max(0, max_stamps * 8 - 3)]
+        for col_idx, (header, value_width) in enumerate(zip(self.HEADERS, value_widths), 1):
+            self.ws.column_dimensions[get_column_letter(col_idx)].width = max(len(header), value_width) + 2
+
+# --- RECORD GIORNALIERO ---
+class DayRecord:
+    # Eventi già come tuple (inizio, fine) e timbrature come secondi epoch: niente json.loads/fromisoformat a ogni accesso
+    __slots__ = ("tipo_giornata", "eventi", "obiettivo_ore", "ore_permesso", "timbrature", "ore_lavorate_sec")
+    DEFAULT_EVENTS = (("08:30", "13:00"), ("14:00", "18:30"))
+    def __init__(self, tipo_giornata="Lavorativo", eventi=DEFAULT_EVENTS, obiettivo_ore=8.5, ore_permesso=0, timbrature=(), ore_lavorate_sec=0):
+        self.tipo_giornata = tipo_giornata; self.eventi = eventi; self.obiettivo_ore = obiettivo_ore
+        self.ore_permesso = ore_permesso; self.timbrature = timbrature; self.ore_lavorate_sec = ore_lavorate_sec
+    @classmethod
+    def from_dict(cls, raw):
+        # Accetta sia il formato storico (eventi come stringa JSON, timbrature ISO) sia quello a shard
+        events = raw.get("eventi_programmati", [])
+        if isinstance(events, str):
+            try: events = json.loads(events)
+            except json.JSONDecodeError: events = []
+        stamps = tuple(ts if isinstance(ts, (int, float)) else datetime.fromisoformat(ts).timestamp() for ts in raw.get("timbrature", []))
+        return cls(raw.get("tipo_giornata", ""), tuple((start, end) for start, end in events), raw.get("obiettivo_ore", 0), raw.get("ore_permesso", 0), stamps, raw.get("ore_lavorate_sec", 0))
+    def copy(self):
+        return DayRecord(self.tipo_giornata, self.eventi, self.obiettivo_ore, self.ore_permesso, self.timbrature, self.ore_lavorate_sec)
+    def to_dict(self):
+        return {"tipo_giornata": self.tipo_giornata, "eventi_programmati": [list(event) for event in self.eventi], "obiettivo_ore": self.obiettivo_ore,
+                "timbrature": list(self.timbrature), "ore_permesso": self.ore_permesso, "ore_lavorate_sec": self.ore_lavorate_sec}
+
+def _write_json_atomic(path, payload):
+    # File temporaneo + rename: su disco c'è sempre la versione vecchia o quella nuova, mai una a metà
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(payload, f, indent=4); f.flush(); os.fsync(f.fileno()); size = f.tell()
+    os.replace(tmp_path, path); INSTRUMENTS.count("snapshot.writes"); INSTRUMENTS.count("snapshot.bytes", size)
+
+# --- JOURNAL DATI (REGISTRO APPEND-ONLY) ---
+class DataJournal:
+    # Ogni modifica viene accodata come riga JSON {data: giornata}. In compattazione il registro viene
+    # ruotato in .old e cancellato solo dopo che gli snapshot che lo contengono sono stati scritti.
+    COMPACT_EVERY = 200
+    def __init__(self, journal_path):
+        self.journal_path = journal_path; self.rotated_path = journal_path + ".old"; self.pending = 0; self.lock = threading.Lock()
+    def replay(self):
+        # Il registro ruotato (compattazione interrotta) va riapplicato prima di quello corrente
+        records = self._read(self.rotated_path) + self._read(self.journal_path)
+        self.pending = len(records); return records
+    def _read(self, path):
+        if not os.path.exists(path): return []
+        # Una riga illeggibile seguita da righe valide si salta; si tronca solo la coda dopo l'ultima riga valida
+        records = []; valid_size = 0; offset = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                offset += len(line)
+                if not line.endswith(b"\n"): break  # scrittura troncata: la coda non è affidabile
+                try: record = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError): continue
+                if not isinstance(record, dict): continue
+                records.append(record); valid_size = offset
+        if valid_size != os.path.getsize(path):
+            with open(path, 'r+b') as f: f.truncate(valid_size)
+        return records
+    def append(self, days):
+        if not days: return
+        line = (json.dumps(days, separators=(',', ':')) + "\n").encode('utf-8')
+        with self.lock: self._append_bytes(self.journal_path, line); self.pending += 1
+        INSTRUMENTS.count("journal.writes"); INSTRUMENTS.count("journal.bytes", len(line))
+    @staticmethod
+    def _append_bytes(path, payload):
+        # Una scrittura fallita a metà (disco pieno) non deve lasciare una riga parziale: il tentativo
+        # successivo la metterebbe in mezzo al registro
+        with open(path, 'ab') as f:
+            start = f.tell()
+            try: f.write(payload); f.flush(); os.fsync(f.fileno())
+            except BaseException:
+                f.truncate(start); raise
+    def needs_compaction(self): return self.pending >= self.COMPACT_EVERY
+    def rotate(self):
+        # Da chiamare con self.lock acquisito, insieme alla copia dei dati da consolidare
+        if os.path.exists(self.journal_path):
+            if os.path.exists(self.rotated_path):
+                with open(self.journal_path, 'rb') as src: self._append_bytes(self.rotated_path, src.read())
+                os.remove(self.journal_path)
+            else: os.replace(self.journal_path, self.rotated_path)
+        self.pending = 0
+    def discard_rotated(self):
+        if os.path.exists(self.rotated_path): os.remove(self.rotated_path)
+
+# --- SCRITTURA DIFFERITA DEL REGISTRO ---
+class PersistenceWriter:
+    # Le giornate modificate si accumulano per COALESCE_DELAY secondi e finiscono nel registro con una sola
+    # riga (un solo fsync) scritta da un thread in background: più modifiche di fila alla stessa giornata
+    # costano una scrittura. flush() scrive subito quanto resta, nel thread chiamante.
+    # Se la scrittura fallisce la coda resta in memoria, error resta impostato (la UI lo mostra) e il thread
+    # riprova con attesa crescente da RETRY_MIN_DELAY a RETRY_MAX_DELAY secondi.
+    COALESCE_DELAY = 0.5; RETRY_MIN_DELAY = 5; RETRY_MAX_DELAY = 300
+    def __init__(self, journal):
+        self.journal = journal; self.pending = {}; self.condition = threading.Condition(); self.write_lock = threading.Lock()
+        self.closed = False; self.error = None; self.retry_delay = 0; self._thread = None
+    def mark_dirty(self, days):
+        # days è già serializzato: il thread non tocca mai i DayRecord che la UI sta modificando
+        with self.condition:
+            self.pending.update(days); self.condition.notify()
+            if not self.closed and (self._thread is None or not self._thread.is_alive()): self._thread = threading.Thread(target=self._run, daemon=True); self._thread.start()
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed: self.condition.wait()
+                # Dopo un errore si aspetta comunque: nuove modifiche non anticipano il tentativo
+                if self.retry_delay: self.condition.wait_for(lambda: self.closed, timeout=self.retry_delay)
+                if self.closed: return
+            time.sleep(self.COALESCE_DELAY)
+            try: self._write_pending()
+            except Exception: self.retry_delay = min(max(self.retry_delay * 2, self.RETRY_MIN_DELAY), self.RETRY_MAX_DELAY)
+            else: self.retry_delay = 0
+    def _write_pending(self):
+        # Presa della coda e scrittura sotto lo stesso lock: le righe finiscono nel registro in ordine
+        with self.write_lock:
+            with self.condition: batch = self.pending; self.pending = {}
+            try: self.journal.append(batch)
+            except Exception as e:
+                with self.condition: self.pending = {**batch, **self.pending}
+                self.error = e; INSTRUMENTS.count("journal.errors"); raise
+            self.error = None
+    def flush(self):
+        # Mai un'eccezione verso la UI (on_pause, on_stop, export): l'esito resta in error
+        try: self._write_pending(); return True
+        except Exception: return False
+    def close(self):
+        with self.condition: self.closed = True; self.condition.notify()
+        self.flush()
+
+# --- ARCHIVIO DATI DIVISO PER ANNO ---
+class DataStore:
+    # Storico in chronos_mobile_data/AAAA.json: all'avvio si leggono solo gli anni richiesti, gli altri al
+    # primo accesso (calendario, export). Le modifiche vanno nel registro; in compattazione si riscrivono
+    # solo gli anni toccati. Il vecchio file unico viene diviso per anno al primo avvio.
+    def __init__(self, shard_dir, legacy_path, journal_path):
+        self.shard_dir = shard_dir; self.legacy_path = legacy_path; self.journal = DataJournal(journal_path); self.writer = PersistenceWriter(self.journal)
+        self.days = {}; self.loaded_years = set(); self.shard_years = set(); self.overlay = {}; self.dirty_years = set()
+        self.year_loaded_callbacks = []; self._compactor = None; self.compaction_error = None
+    @INSTRUMENTS.timed("store.open")
+    def open(self, years):
+        os.makedirs(self.shard_dir, exist_ok=True)
+        if os.path.exists(self.legacy_path): self._migrate_legacy()
+        self.shard_years = {name[:-5] for name in os.listdir(self.shard_dir) if name.endswith(".json") and name[:-5].isdigit()}
+        # Le righe del registro per anni non ancora caricati restano da parte fino al caricamento dell'anno
+        for record in self.journal.replay():
+            for date_str, raw in record.items(): self.overlay.setdefault(date_str[:4], {})[date_str] = raw; self.dirty_years.add(date_str[:4])
+        for year in sorted(years): self.ensure_year(year)
+    def _shard_path(self, year): return os.path.join(self.shard_dir, f"{year}.json")
+    def _migrate_legacy(self):
+        try:
+            with open(self.legacy_path, 'r', encoding='utf-8') as f: legacy = json.load(f)
+        except (json.JSONDecodeError, FileNotFoundError): legacy = {}
+        by_year = {}
+        for date_str, raw in sorted(legacy.items()): by_year.setdefault(date_str[:4], {})[date_str] = DayRecord.from_dict(raw).to_dict()
+        for year, days in by_year.items(): _write_json_atomic(self._shard_path(year), days)
+        # Il file originale resta come copia di sicurezza, rinominato solo a migrazione completata
+        os.replace(self.legacy_path, self.legacy_path + ".migrated")
+    def ensure_year(self, year):
+        if year in self.loaded_years: return
+        with INSTRUMENTS.span("store.load_year"): self._load_year(year)
+    def _load_year(self, year):
+        self.loaded_years.add(year); loaded = {}
+        if year in self.shard_years:
+            try:
+                with open(self._shard_path(year), 'r', encoding='utf-8') as f: raw_days = json.load(f)
+            except (json.JSONDecodeError, FileNotFoundError): raw_days = {}
+            for date_str, raw in raw_days.items(): loaded[date_str] = DayRecord.from_dict(raw)
+        for date_str, raw in self.overlay.pop(year, {}).items(): loaded[date_str] = DayRecord.from_dict(raw)
+        self.days.update(loaded)
+        for callback in self.year_loaded_callbacks: callback(loaded)
+    def get(self, date_str, default=None):
+        self.ensure_year(date_str[:4]); return self.days.get(date_str, default)
+    def put_days(self, changed_days):
+        for year in {date_str[:4] for date_str in changed_days}: self.ensure_year(year)
+        self.days.update(changed_days); self.dirty_years.update(date_str[:4] for date_str in changed_days)
+        self.writer.mark_dirty({date_str: day_data.to_dict() for date_str, day_data in changed_days.items()})
+        if self.journal.needs_compaction(): self.compact()
+    def flush(self): return self.writer.flush()
+    def is_empty(self): return not self.days and not self.shard_years and not self.overlay
+    def range_days(self, start_date=None, end_date=None):
+        start_str = start_date.strftime("%Y-%m-%d") if start_date else ""; end_str = end_date.strftime("%Y-%m-%d") if end_date else "9999-12-31"
+        for year in sorted(self.shard_years | set(self.overlay)):
+            if start_str[:4] <= year <= end_str[:4]: self.ensure_year(year)
+        return {date_str: day_data for date_str, day_data in self.days.items() if start_str <= date_str <= end_str}
+    def compact(self, background=True):
+        if not self.dirty_years: return
+        if self._compactor is not None and self._compactor.is_alive():
+            if background: return
+            self._compactor.join()
+        for year in sorted(self.dirty_years): self.ensure_year(year)
+        # La coda va nel registro prima della rotazione: finisce nel .old, che resta finché gli snapshot
+        # non sono scritti. Se la scrittura fallisce resta in coda e andrà nel nuovo registro.
+        self.writer.flush()
+        with self.journal.lock:
+            # Copia e rotazione avvengono insieme: ciò che arriva dopo finisce nel nuovo registro
+            shards = {year: {} for year in self.dirty_years}
+            for date_str in sorted(self.days):
+                if date_str[:4] in shards: shards[date_str[:4]][date_str] = self.days[date_str].to_dict()
+            # Rotazione fallita (copia nel .old): registro e anni sporchi restano com'erano, nessuna eccezione alla UI
+            try: self.journal.rotate()
+            except Exception as e: self.compaction_error = e; return False
+            self.dirty_years = set(); self.shard_years.update(shards)
+        if background: self._compactor = threading.Thread(target=self._write_shards, args=(shards,), daemon=True); self._compactor.start(); return True
+        return self._write_shards(shards)
+    def _write_shards(self, shards):
+        # Il .old si cancella solo se tutti gli anni sono su disco; altrimenti gli anni tornano sporchi e il
+        # .old resta: la prossima compattazione li riscrive, e un riavvio li recupera dal registro
+        try:
+            for year, days in shards.items(): _write_json_atomic(self._shard_path(year), days)
+        except Exception as e:
+            with self.journal.lock: self.dirty_years.update(shards)
+            self.compaction_error = e; return False
+        self.journal.discard_rotated(); self.compaction_error = None; return True
+
+# --- IMPORTAZIONE TIMBRATURE DA BADGE (CSV/XLSX) ---
+class BadgeImporter:
+    # Legge il file a blocchi e fa parsing, ordinamento, deduplica e accoppiamento ingresso/uscita
+    # con pandas su intere colonne; le giornate risultanti si confrontano poi con l'archivio.
+    CHUNK_ROWS = 50000; MIN_GAP_SECONDS = 60
+    DATETIME_COLUMNS = ("timestamp", "data_ora", "data ora", "dataora", "datetime", "timbratura")
+    DATE_COLUMNS = ("data", "date", "giorno"); TIME_COLUMNS = ("ora", "orario", "time")
+    def __init__(self, file_path):
+        self.file_path = file_path; self.days = {}; self.odd_days = []
+        self.stats = {"righe": 0, "non_valide": 0, "duplicati": 0, "timbrature": 0}
+    def prepare(self, progress_callback=None, cancel_event=None):
+        stamps = self.read_stamps(progress_callback, cancel_event)
+        if stamps is None: return False
+        self.days, self.odd_days = self.build_days(stamps); return True
+    def _read_chunks(self):
+        import pandas as pd
+        if self.file_path.lower().endswith((".xlsx", ".xlsm")):
+            import openpyxl
+            workbook = openpyxl.load_workbook(self.file_path, read_only=True, data_only=True)
+            try:
+                rows = workbook.active.iter_rows(values_only=True); header = [str(cell).strip().lower() if cell is not None else "" for cell in next(rows, ())]
+                chunk = []
+                for row in rows:
+                    chunk.append(row[:len(header)])
+                    if len(chunk) >= self.CHUNK_ROWS: yield pd.DataFrame(chunk, columns=header); chunk = []
+                if chunk: yield pd.DataFrame(chunk, columns=header)
+            finally: workbook.close()
+        else:
+            with open(self.file_path, 'r', encoding='utf-8-sig', newline='') as f: sample = f.read(4096)
+            try: delimiter = csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+            except csv.Error: delimiter = ","
+            for chunk in pd.read_csv(self.file_path, sep=delimiter, chunksize=self.CHUNK_ROWS, dtype=str, encoding='utf-8-sig', skipinitialspace=True):
+                chunk.columns = [str(column).strip().lower() for column in chunk.columns]; yield chunk
+    def _parse_chunk(self, frame):
+        import pandas as pd
+        columns = set(frame.columns); datetime_col = next((c for c in self.DATETIME_COLUMNS if c in columns), None)
+        if datetime_col is not None: return self._parse_datetimes(frame[datetime_col])
+        date_col = next((c for c in self.DATE_COLUMNS if c in columns), None); time_col = next((c for c in self.TIME_COLUMNS if c in columns), None)
+        if date_col is None or time_col is None: raise ValueError("Colonne non riconosciute: serve data/ora in una colonna o data e ora separate.")
+        # Data e ora si sommano come valori (giorno + durata), senza ripassare da stringhe: le celle data
+        # native dell'XLSX non vengono mai reinterpretate
+        dates = self._parse_datetimes(frame[date_col]).dt.normalize(); times = frame[time_col]
+        if pd.api.types.is_datetime64_any_dtype(times): offsets = times - times.dt.normalize()  # ora salvata come data-ora Excel
+        else:
+            text = times.astype(str).str.strip(); offsets = pd.to_timedelta(text.where(text.str.count(":") != 1, text + ":00"), errors='coerce')
+        return dates + offsets
+    @staticmethod
+    def _parse_datetimes(raw):
+        import pandas as pd
+        if pd.api.types.is_datetime64_any_dtype(raw): return raw
+        # Prima ISO 8601 (AAAA-MM-GG, mai ambiguo); solo le righe rimaste fuori come GG/MM/AAAA, con il formato
+        # dedotto dalla prima di esse e infine, per le ultime, parsing misto
+        stamps = pd.to_datetime(raw, format='ISO8601', errors='coerce'); retry = stamps.isna() & raw.notna()
+        if retry.any(): stamps[retry] = pd.to_datetime(raw[retry], dayfirst=True, errors='coerce')
+        retry = stamps.isna() & raw.notna()
+        if retry.any(): stamps[retry] = pd.to_datetime(raw[retry], dayfirst=True, errors='coerce', format='mixed')
+        return stamps
+    def read_stamps(self, progress_callback=None, cancel_event=None):
+        import pandas as pd
+        parts = []
+        for frame in self._read_chunks():
+            if cancel_event is not None and cancel_event.is_set(): return None
+            stamps = self._parse_chunk(frame); valid = stamps.dropna()
+            self.stats["righe"] += len(stamps); self.stats["non_valide"] += len(stamps) - len(valid); parts.append(valid)
+            if progress_callback is not None: progress_callback(self.stats["righe"])
+        if not parts: return pd.Series([], dtype="datetime64[ns]")
+        stamps = pd.concat(parts, ignore_index=True).dt.floor("s").sort_values(ignore_index=True)
+        unique = stamps.drop_duplicates(ignore_index=True)
+        # Letture ripetute del badge a pochi secondi di distanza valgono come una sola timbratura
+        days = unique.dt.normalize(); close = (days == days.shift()) & (unique.diff().dt.total_seconds() < self.MIN_GAP_SECONDS)
+        unique = unique[~close].reset_index(drop=True)
+        self.stats["duplicati"] = len(stamps) - len(unique); self.stats["timbrature"] = len(unique)
+        return unique
+    def build_days(self, stamps):
+        import pandas as pd
+        from dateutil import tz
+        if stamps.empty: return {}, []
+        frame = pd.DataFrame({"day": stamps.dt.strftime("%Y-%m-%d")})
+        # Secondi epoch nel fuso locale, come datetime.timestamp() per le timbrature fatte dall'app
+        local = stamps.dt.tz_localize(tz.tzlocal(), ambiguous='NaT', nonexistent='shift_forward')
+        frame["epoch"] = (local - pd.Timestamp("1970-01-01", tz="UTC")).dt.total_seconds()
+        frame = frame.dropna(subset=["epoch"])
+        grouped = frame.groupby("day", sort=True); frame["pos"] = grouped.cumcount(); frame["count"] = grouped["epoch"].transform("size")
+        # Posizioni pari = ingresso, dispari = uscita; un ingresso finale senza uscita non conta nel lavorato
+        paired = frame["pos"] < frame["count"] - frame["count"] % 2
+        frame["signed"] = frame["epoch"].where(frame["pos"] % 2 == 1, -frame["epoch"]).where(paired, 0.0)
+        worked = frame.groupby("day", sort=True)["signed"].sum(); stamps_by_day = frame.groupby("day", sort=True)["epoch"].agg(tuple)
+        counts = grouped.size(); odd_days = list(counts.index[counts % 2 == 1])
+        return {day: (stamps_by_day[day], float(worked[day])) for day in worked.index}, odd_days
+    def plan(self, data_store, overwrite=False):
+        changed_days = {}; conflicts = []; unchanged = 0
+        for date_str, (stamps, worked_seconds) in self.days.items():
+            existing = data_store.get(date_str)
+            if existing is not None and existing.timbrature == stamps: unchanged += 1; continue
+            # Permesso e Art. 104 sono giornate lavorate in parte: le timbrature si aggiungono come a un giorno
+            # lavorativo, tenendo ore di permesso, obiettivo ed eventi
+            full_absence = existing is not None and existing.tipo_giornata not in ("Lavorativo", "") and existing.tipo_giornata not in ABSENCE_TYPES_HOURLY
+            conflict = None
+            if full_absence: conflict = f"giornata di tipo {existing.tipo_giornata}"
+            elif existing is not None and existing.timbrature: conflict = f"{len(existing.timbrature)} timbrature esistenti, {len(stamps)} importate"
+            if conflict is not None:
+                conflicts.append((date_str, conflict))
+                if not overwrite: continue
+            # Un'assenza di giornata intera sostituita torna Lavorativo con eventi e obiettivo predefiniti:
+            # timbrature su un obiettivo di 0 ore varrebbero come credito pieno nel saldo
+            day_data = existing.copy() if existing is not None and not full_absence else DayRecord()
+            day_data.timbrature = stamps; day_data.ore_lavorate_sec = worked_seconds; changed_days[date_str] = day_data
+        return changed_days, conflicts, unchanged
+
+# --- MOTORE DI ANALISI (RIEPILOGHI MENSILI / ANNUALI) ---
+class AnalyticsEngine:
+    # Lo storico diventa una tabella a colonne (una riga per giorno) costruita una volta sola;
+    # le modifiche sostituiscono solo le righe dei giorni toccati al successivo accesso.
+    SUM_COLUMNS = ["obiettivo_sec", "permesso_sec", "lavorato_sec", "saldo_sec"]
+    OVERTIME_BANDS = ["Debito", "0-30 min", "30-60 min", "1-2 ore", "Oltre 2 ore"]
+    def __init__(self, data_store): self.store = data_store; self._frame = None; self._pending = {}
+    def invalidate(self, changed_days):
+        if self._frame is not None: self._pending.update(changed_days)
+    def frame(self):
+        if self._frame is None: self._frame = self.build_frame(self.store.days); self._pending = {}
+        elif self._pending:
+            import pandas as pd
+            updates = self.build_frame(self._pending); self._pending = {}
+            self._frame = pd.concat([self._frame.drop(index=updates.index, errors='ignore'), updates]).sort_index()
+        return self._frame
+    @staticmethod
+    def build_frame(days):
+        import pandas as pd
+        from dateutil import tz
+        dates = list(days); records = [days[date_str] for date_str in dates]
+        frame = pd.DataFrame({
+            "tipo": [day_data.tipo_giornata for day_data in records],
+            "obiettivo_sec": [day_data.obiettivo_ore * 3600 for day_data in records],
+            "permesso_sec": [day_data.ore_permesso * 3600 for day_data in records],
+            "lavorato_sec": [day_data.ore_lavorate_sec for day_data in records],
+            "ingresso": [day_data.timbrature[0] if day_data.timbrature else None for day_data in records],
+            "uscita": [day_data.timbrature[-1] if len(day_data.timbrature) > 1 else None for day_data in records],
+        }, index=pd.DatetimeIndex(pd.to_datetime(dates, format="%Y-%m-%d"), name="data"))
+        frame["saldo_sec"] = frame["lavorato_sec"] + frame["permesso_sec"] - frame["obiettivo_sec"]
+        for column in ("ingresso", "uscita"):
+            # Ora del giorno in secondi, nel fuso locale come le timbrature mostrate dall'app
+            local = pd.to_datetime(frame[column], unit='s', utc=True).dt.tz_convert(tz.tzlocal())
+            frame[column + "_sec"] = local.dt.hour * 3600 + local.dt.minute * 60 + local.dt.second
+        return frame.drop(columns=["ingresso", "uscita"]).sort_index()
+    @staticmethod
+    def until(frame, date_str):
+        # Solo i giorni fino a date_str compreso (indice ordinato): i totali coincidono con BalanceIndex
+        return frame.loc[:date_str]
+    @staticmethod
+    def _period_keys(frame, period):
+        if period == "W":
+            iso = frame.index.isocalendar(); return (iso["year"].astype(str) + "-W" + iso["week"].astype(str).str.zfill(2)).values
+        if period == "M": return frame.index.to_period("M").astype(str)
+        return frame.index.year.astype(str)
+    @classmethod
+    def period_totals(cls, frame, period):
+        # period: "W" settimana ISO, "M" mese, "Y" anno
+        keys = cls._period_keys(frame, period)
+        totals = frame.groupby(keys)[cls.SUM_COLUMNS].sum()
+        totals["giorni_lavorati"] = frame["lavorato_sec"].gt(0).groupby(keys).sum()
+        return totals.join(frame[["ingresso_sec", "uscita_sec"]].groupby(keys).mean())
+    @classmethod
+    def overtime_distribution(cls, frame):
+        import pandas as pd
+        worked = frame[frame["lavorato_sec"] > 0]
+        bands = pd.cut(worked["saldo_sec"], bins=[float("-inf"), 0, 1800, 3600, 7200, float("inf")], labels=cls.OVERTIME_BANDS, right=False)
+        return pd.crosstab(cls._period_keys(worked, "Y"), bands).reindex(columns=cls.OVERTIME_BANDS, fill_value=0)
+    @classmethod
+    def absences_by_type(cls, frame):
+        import pandas as pd
+        absences = frame[~frame["tipo"].isin(["Lavorativo", ""])]
+        counts = pd.crosstab(cls._period_keys(absences, "Y"), absences["tipo"].values)
+        permits = frame["permesso_sec"].groupby(cls._period_keys(frame, "Y")).sum() / 3600
+        return counts.reindex(permits.index, fill_value=0).assign(ore_permesso=permits)
+    @staticmethod
+    def format_time_of_day(seconds):
+        if seconds != seconds: return "--:--"  # NaN: nessuna timbratura nel periodo
+        h, rem = divmod(int(seconds), 3600); return f"{h:02}:{rem // 60:02}"
+
+# --- INDICE SALDI (GIORNO / SETTIMANA / MESE / ANNO) ---
+class BalanceIndex:
+    # Saldo = Lavorato + Permesso - Obiettivo, come nel report. Ogni modifica applica solo la differenza
+    # ai totali di settimana, mese e anno; i giorni oltre la data di riferimento restano in attesa.
+    def __init__(self, data_dict, cutoff_str):
+        self.cutoff_str = cutoff_str; self.days = {}; self.future = {}; self.weeks = {}; self.months = {}; self.years = {}
+        for date_str, day_data in data_dict.items(): self.set_day(date_str, day_data)
+    @staticmethod
+    def day_balance_seconds(day_data):
+        return day_data.ore_lavorate_sec + day_data.ore_permesso * 3600 - day_data.obiettivo_ore * 3600
+    @staticmethod
+    def _keys(date_str):
+        return datetime.strptime(date_str, "%Y-%m-%d").date().isocalendar()[:2], date_str[:7], date_str[:4]
+    def _apply(self, date_str, delta):
+        week_key, month_key, year_key = self._keys(date_str)
+        self.weeks[week_key] = self.weeks.get(week_key, 0) + delta; self.months[month_key] = self.months.get(month_key, 0) + delta; self.years[year_key] = self.years.get(year_key, 0) + delta
+    def set_day(self, date_str, day_data):
+        balance = self.day_balance_seconds(day_data)
+        if date_str > self.cutoff_str: self.future[date_str] = balance; return
+        delta = balance - self.days.get(date_str, 0); self.days[date_str] = balance
+        if delta: self._apply(date_str, delta)
+    def update_days(self, changed_days):
+        for date_str, day_data in changed_days.items(): self.set_day(date_str, day_data)
+    def advance(self, cutoff_str):
+        # Cambio di giorno: i giorni ora non più futuri entrano nei totali
+        self.cutoff_str = cutoff_str
+        for date_str in [d for d in self.future if d <= cutoff_str]:
+            self.days[date_str] = self.future.pop(date_str); self._apply(date_str, self.days[date_str])
+    def day_balance(self, date_str): return self.days.get(date_str, 0)
+    def week_balance(self, date_str): return self.weeks.get(self._keys(date_str)[0], 0)
+    def month_balance(self, date_str): return self.months.get(date_str[:7], 0)
+    def year_balance(self, date_str): return self.years.get(date_str[:4], 0)
+
+# --- INDICE MENSILE DEL CALENDARIO ---
+class CalendarIndex:
+    # Tipi di giornata per mese ("YYYY-MM" -> {giorno: tipo}): ogni mese si costruisce alla prima visita,
+    # poi si aggiornano solo le date modificate.
+    def __init__(self, data_dict): self.data = data_dict; self.months = {}
+    def get_month(self, year, month):
+        month_key = f"{year:04}-{month:02}"; month_types = self.months.get(month_key)
+        if month_types is None:
+            month_types = {}
+            for day in range(1, calendar.monthrange(year, month)[1] + 1):
+                day_data = self.data.get(f"{month_key}-{day:02}")
+                if day_data is not None: month_types[day] = day_data.tipo_giornata
+            self.months[month_key] = month_types
+        return month_types
+    def update_days(self, changed_days):
+        for date_str, day_data in changed_days.items():
+            month_types = self.months.get(date_str[:7])
+            if month_types is not None: month_types[int(date_str[8:10])] = day_data.tipo_giornata
+
+# --- MOTORE DELL'APP (SENZA INTERFACCIA) ---
+class ChronosEngine:
+    # Stato e regole dell'app: archivio, indici e giornata corrente. ChronosMobileApp si limita a
+    # chiamare questi metodi e a ridisegnare; benchmark e script li usano senza GUI.
+    def __init__(self, shard_dir, legacy_path, journal_path, today=None):
+        # Anno corrente (e il precedente se la settimana in corso è iniziata lì); il resto al primo accesso
+        today = today or date.today(); week_start = today - timedelta(days=today.weekday())
+        self.data = DataStore(shard_dir, legacy_path, journal_path); self.data.open({str(today.year), str(week_start.year)})
+        self.balance_index = BalanceIndex(self.data.days, today.strftime("%Y-%m-%d")); self.calendar_index = CalendarIndex(self.data)
+        self.analytics = AnalyticsEngine(self.data)
+        self.data.year_loaded_callbacks.append(self.balance_index.update_days); self.data.year_loaded_callbacks.append(self.analytics.invalidate)
+        self.reload_today(datetime.combine(today, datetime.now().time()))
+    def reload_today(self, now=None):
+        self.today_str = (now or datetime.now()).strftime("%Y-%m-%d")
+        if self.today_str > self.balance_index.cutoff_str: self.balance_index.advance(self.today_str)
+        self.today_data = self.data.get(self.today_str, self.default_day_data())
+        self.timestamps = [datetime.fromtimestamp(ts) for ts in self.today_data.timbrature]
+        self.closed_seconds = self.sum_closed_intervals(self.timestamps)
+    def roll_over(self, now):
+        # Un intervallo ancora aperto viene chiuso alla mezzanotte del giorno in cui è iniziato
+        if self.is_working(): self.log_today(datetime.strptime(self.today_str, "%Y-%m-%d") + timedelta(days=1))
+        self.reload_today(now)
+    def is_working(self): return len(self.timestamps) % 2 != 0
+    def stamp(self, now=None):
+        now = now or datetime.now()
+        if self.timestamps and (now - self.timestamps[-1]).total_seconds() < 1: return False
+        self.timestamps.append(now)
+        if not self.is_working(): self.closed_seconds += (self.timestamps[-1] - self.timestamps[-2]).total_seconds()
+        self.log_today(now); return True
+    @staticmethod
+    def sum_closed_intervals(timestamps):
+        total_seconds = 0
+        for i in range(0, len(timestamps) - 1, 2): total_seconds += (timestamps[i+1] - timestamps[i]).total_seconds()
+        return total_seconds
+    def calculate_worked_seconds(self, current_time):
+        # Gli intervalli chiusi sono già sommati in closed_seconds: al tick resta solo quello aperto
+        if self.is_working(): return self.closed_seconds + (current_time - self.timestamps[-1]).total_seconds()
+        return self.closed_seconds
+    def period_balances(self, today_balance):
+        # Totali già indicizzati: al saldo registrato di oggi si sostituisce quello in tempo reale
+        live_delta = today_balance - self.balance_index.day_balance(self.today_str)
+        return (self.balance_index.week_balance(self.today_str) + live_delta, self.balance_index.month_balance(self.today_str) + live_delta, self.balance_index.year_balance(self.today_str) + live_delta)
+    def log_today(self, now=None):
+        worked_seconds = self.calculate_worked_seconds(now or datetime.now())
+        self.today_data.timbrature = tuple(ts.timestamp() for ts in self.timestamps)
+        self.today_data.ore_lavorate_sec = worked_seconds
+        self.save_data({self.today_str: self.today_data})
+    @INSTRUMENTS.timed("engine.save_data")
+    def save_data(self, changed_days):
+        # Solo le giornate modificate vanno su disco; gli anni toccati si riscrivono in compattazione
+        self.data.put_days(changed_days); INSTRUMENTS.count("engine.saved_days", len(changed_days))
+        self.balance_index.update_days(changed_days); self.calendar_index.update_days(changed_days); self.analytics.invalidate(changed_days)
+    def flush(self): return self.data.flush()
+    def persistence_error(self):
+        # Scrittura del registro fallita: le modifiche sono solo in memoria finché un tentativo non riesce
+        if self.data.writer.error is not None: return f"Salvataggio non riuscito ({self.data.writer.error}): modifiche solo in memoria, nuovo tentativo in corso."
+        if self.data.compaction_error is not None: return f"Compattazione non riuscita ({self.data.compaction_error}): dati al sicuro nel registro."
+        return None
+    def close(self): self.log_today(); self.data.writer.close(); self.data.compact(background=False)
+    @staticmethod
+    def calculate_hours_from_events(events_list):
+        total_minutes = 0
+        for start, end in events_list:
+            try: t_start = datetime.strptime(start, "%H:%M"); t_end = datetime.strptime(end, "%H:%M"); total_minutes += (t_end - t_start).total_seconds() / 60
+            except ValueError: return 0.0
+        return round(total_minutes / 60, 2)
+    @staticmethod
+    def default_day_data(): return DayRecord()
+    def update_day_data(self, date_str, day_type, events_data, hours_text):
+        day_data = self.data.get(date_str, self.default_day_data())
+        day_data.tipo_giornata = day_type
+        if day_type == "Lavorativo":
+            day_data.eventi = tuple(tuple(event) for event in events_data)
+            day_data.obiettivo_ore = self.calculate_hours_from_events(day_data.eventi); day_data.ore_permesso = 0
+        elif day_type in ABSENCE_TYPES_HOURLY:
+            day_data.ore_permesso = float(hours_text or 0)
+        else:
+            day_data.obiettivo_ore = 0; day_data.ore_permesso = 0
+        self.save_data({date_str: day_data})
+        if date_str == self.today_str: self.reload_today()
+        return day_data
+    def update_period_data(self, start_date, end_date, day_type):
+        current_date = start_date; changed_days = {}
+        while current_date <= end_date:
+            if current_date.weekday() < 5:
+                date_str = current_date.strftime("%Y-%m-%d")
+                day_data = self.data.get(date_str, self.default_day_data())
+                day_data.tipo_giornata = day_type; day_data.ore_permesso = 0; day_data.obiettivo_ore = 0
+                changed_days[date_str] = day_data
+            current_date += timedelta(days=1)
+        self.save_data(changed_days)
+        if self.today_str in changed_days: self.reload_today()
+        return changed_days
@@ -1,6 +1,8 @@
 # File: chronos_mobile.py
 # Modulo: Chronos Mobile v2.2 (Definitivo)
 # Identificativo: realizzazione CRk969
+import time
+_IMPORT_STARTED = time.perf_counter()
 import kivy
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
@@ -10,82 +12,31 @@ from kivy.uix.button import Button
 from kivy.uix.popup import Popup
 from kivy.uix.textinput import TextInput
 from kivy.uix.spinner import Spinner
+from kivy.uix.progressbar import ProgressBar
+from kivy.uix.scrollview import ScrollView
 from kivy.uix.screenmanager import ScreenManager, Screen, NoTransition
 from kivy.clock import Clock
 from datetime import datetime, timedelta, date
 import json
 import os
 import calendar
-import pandas as pd
-import openpyxl
-from openpyxl.styles import Font, Alignment
+import threading
+from chronos_core import DAY_TYPES, ABSENCE_TYPES_HOURLY, AnalyticsEngine, BadgeImporter, BalanceIndex, ChronosEngine, ExcelReportGenerator, INSTRUMENTS, seconds_to_hms
 
 kivy.require('2.0.0')
 
-# --- CLASSE EXCEL GENERATOR (ORA INCLUSA) ---
-class ExcelReportGenerator:
-    def __init__(self, data_dict):
-        self.data = data_dict
-        self.workbook = openpyxl.Workbook()
-        self.ws = self.workbook.active
-        self.ws.title = "Riepilogo Ore"
-
-    def generate_report(self, file_path):
-        headers = ["Data", "Tipo Giornata", "Obiettivo Ore", "Ore Permesso", "Ore Lavorate", "Saldo Giornaliero", "Timbrature"]
-        self.ws.append(headers)
-        
-        for date_str, day_data in sorted(self.data.items()):
-            timbrature_str = " | ".join([datetime.fromisoformat(ts).strftime('%H:%M') for ts in day_data.get("timbrature", [])])
-            worked_seconds = day_data.get("ore_lavorate_sec", 0)
-            target_seconds = day_data.get("obiettivo_ore", 0) * 3600
-            permit_seconds = day_data.get("ore_permesso", 0) * 3600
-            # Saldo = Lavorato + Permesso - Obiettivo
-            balance_seconds = worked_seconds + permit_seconds - target_seconds
-            
-            row = [
-                date_str,
-                day_data.get("tipo_giornata", ""),
-                f"{day_data.get('obiettivo_ore', 0):.2f}",
-                f"{day_data.get('ore_permesso', 0):.2f}",
-                self._seconds_to_hms(worked_seconds),
-                self._seconds_to_hms(balance_seconds, show_sign=True),
-                timbrature_str
-            ]
-            self.ws.append(row)
-        
-        self._format_sheet()
-        self.workbook.save(file_path)
-
-    def _seconds_to_hms(self, seconds, show_sign=False):
-        sign = "-" if seconds < 0 else "+" if show_sign else ""
-        seconds = int(abs(seconds))
-        h, rem = divmod(seconds, 3600); m, s = divmod(rem, 60)
-        return f"{sign}{h:02}:{m:02}:{s:02}"
-        
-    def _format_sheet(self):
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = openpyxl.styles.PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-        for cell in self.ws[1]: cell.font = header_font; cell.fill = header_fill
-        for col in self.ws.columns:
-            max_length = 0
-            for cell in col:
-                try: 
-                    if len(str(cell.value)) > max_length: max_length = len(str(cell.value))
-                except: pass
-            adjusted_width = (max_length + 2)
-            self.ws.column_dimensions[col[0].column_letter].width = adjusted_width
-
 # --- CLASSE POPUP DI PIANIFICAZIONE ---
 class PlannerPopup(Popup):
-    DAY_TYPES = ["Lavorativo", "Ferie", "Permesso", "Malattia", "Festività", "Art. 104"]
-    ABSENCE_TYPES_HOURLY = ["Permesso", "Art. 104"]
+    DAY_TYPES = DAY_TYPES
+    ABSENCE_TYPES_HOURLY = ABSENCE_TYPES_HOURLY
+    @INSTRUMENTS.timed("ui.planner_popup")
     def __init__(self, app, date_obj, **kwargs):
         super().__init__(**kwargs); self.title = f"Pianifica: {date_obj.strftime('%d/%m/%Y')}"; self.size_hint = (0.95, 0.9)
-        self.app = app; self.date_str = date_obj.strftime("%Y-%m-%d"); self.day_data = self.app.data.get(self.date_str, self.app._get_default_day_data(self.date_str))
+        self.app = app; self.date_obj = date_obj; self.date_str = date_obj.strftime("%Y-%m-%d"); self.day_data = self.app.engine.data.get(self.date_str, self.app.engine.default_day_data()); self.events = list(self.day_data.eventi)
         main_layout = BoxLayout(orientation='vertical', padding=10, spacing=10)
         type_layout = BoxLayout(size_hint_y=None, height='40dp'); type_layout.add_widget(Label(text="Tipo Giornata:"))
-        self.spinner_type = Spinner(text=self.day_data.get('tipo_giornata', 'Lavorativo'), values=self.DAY_TYPES); self.spinner_type.bind(text=self.toggle_visibility); type_layout.add_widget(self.spinner_type); main_layout.add_widget(type_layout)
-        self.permits_layout = BoxLayout(size_hint_y=None, height='40dp'); self.permits_layout.add_widget(Label(text="Ore Permesso:")); self.hours_input = TextInput(text=str(self.day_data.get('ore_permesso', '0')), multiline=False, input_type='number'); self.permits_layout.add_widget(self.hours_input); main_layout.add_widget(self.permits_layout)
+        self.spinner_type = Spinner(text=self.day_data.tipo_giornata or 'Lavorativo', values=self.DAY_TYPES); self.spinner_type.bind(text=self.toggle_visibility); type_layout.add_widget(self.spinner_type); main_layout.add_widget(type_layout)
+        self.permits_layout = BoxLayout(size_hint_y=None, height='40dp'); self.permits_layout.add_widget(Label(text="Ore Permesso:")); self.hours_input = TextInput(text=str(self.day_data.ore_permesso), multiline=False, input_type='number'); self.permits_layout.add_widget(self.hours_input); main_layout.add_widget(self.permits_layout)
         self.events_layout = BoxLayout(orientation='vertical'); self.events_layout.add_widget(Label(text="Blocchi Orari: definiscono l'obiettivo.", font_size='12sp', size_hint_y=None, height='30dp'))
         self.events_list = GridLayout(cols=1, size_hint_y=None, spacing=5); self.events_list.bind(minimum_height=self.events_list.setter('height')); self.refresh_events_list(); self.events_layout.add_widget(self.events_list)
         add_event_layout = GridLayout(cols=3, size_hint_y=None, height='40dp'); self.start_input = TextInput(hint_text="Inizio (HH:MM)"); self.end_input = TextInput(hint_text="Fine (HH:MM)"); add_btn = Button(text="Aggiungi", on_press=self.add_event)
@@ -98,57 +49,193 @@ class PlannerPopup(Popup):
         elif text in self.ABSENCE_TYPES_HOURLY: self.events_layout.height, self.events_layout.opacity = 0, 0; self.permits_layout.height, self.permits_layout.opacity = '40dp', 1
         else: self.events_layout.height, self.events_layout.opacity = 0, 0; self.permits_layout.height, self.permits_layout.opacity = 0, 0
     def refresh_events_list(self):
-        self.events_list.clear_widgets(); events_data = self.day_data.get("eventi_programmati", "[]")
-        if isinstance(events_data, str): 
-            try: events_data = json.loads(events_data)
-            except json.JSONDecodeError: events_data = []
-        for start, end in events_data:
+        self.events_list.clear_widgets()
+        for start, end in self.events:
             event_row = BoxLayout(size_hint_y=None, height='30dp'); event_row.add_widget(Label(text=f"{start} - {end}"))
             remove_btn = Button(text="X", size_hint_x=None, width='40dp'); remove_btn.bind(on_press=lambda btn, s=start, e=end: self.remove_event(s, e)); event_row.add_widget(remove_btn); self.events_list.add_widget(event_row)
     def add_event(self, instance):
         start, end = self.start_input.text, self.end_input.text
         try:
             datetime.strptime(start, "%H:%M"); datetime.strptime(end, "%H:%M")
-            events_data = self.day_data.get("eventi_programmati", "[]")
-            if isinstance(events_data, str): events_data = json.loads(events_data)
-            events_data.append([start, end]); self.day_data["eventi_programmati"] = json.dumps(sorted(events_data)); self.refresh_events_list(); self.start_input.text = ""; self.end_input.text = ""
+            self.events.append((start, end)); self.events.sort(); self.refresh_events_list(); self.start_input.text = ""; self.end_input.text = ""
         except ValueError: pass
     def remove_event(self, start_time, end_time):
-        events_data = self.day_data.get("eventi_programmati", "[]")
-        if isinstance(events_data, str): events_data = json.loads(events_data)
-        events_data.remove([start_time, end_time]); self.day_data["eventi_programmati"] = json.dumps(events_data); self.refresh_events_list()
+        self.events.remove((start_time, end_time)); self.refresh_events_list()
     def save_changes(self, instance):
-        self.app.update_day_data(self.date_str, self.spinner_type.text, self.day_data.get("eventi_programmati", "[]"), self.hours_input.text)
-        self.dismiss(); self.app.planner_screen.calendar_widget.build_calendar()
+        self.app.update_day_data(self.date_str, self.spinner_type.text, self.events, self.hours_input.text)
+        self.dismiss(); self.app.planner_screen.calendar_widget.refresh_day(self.date_obj)
+
+# --- CLASSE POPUP DI ESPORTAZIONE ---
+class ExportPopup(Popup):
+    RANGE_TYPES = ["Mese corrente", "Anno corrente", "Periodo", "Tutto"]
+    def __init__(self, app, **kwargs):
+        super().__init__(**kwargs); self.title = "Esporta Report"; self.size_hint = (0.9, 0.6); self.auto_dismiss = False
+        self.app = app; self.cancel_event = threading.Event(); self.worker = None
+        main_layout = BoxLayout(orientation='vertical', padding=10, spacing=10)
+        self.spinner_range = Spinner(text="Mese corrente", values=self.RANGE_TYPES, size_hint_y=None, height='40dp'); self.spinner_range.bind(text=self.toggle_visibility); main_layout.add_widget(self.spinner_range)
+        self.period_layout = BoxLayout(size_hint_y=None, height='40dp')
+        self.period_layout.add_widget(Label(text="Dal:")); self.start_date_input = TextInput(hint_text="GG/MM/AAAA", multiline=False); self.period_layout.add_widget(self.start_date_input)
+        self.period_layout.add_widget(Label(text="Al:")); self.end_date_input = TextInput(hint_text="GG/MM/AAAA", multiline=False); self.period_layout.add_widget(self.end_date_input); main_layout.add_widget(self.period_layout)
+        self.progress_bar = ProgressBar(max=1, value=0, size_hint_y=None, height='20dp'); main_layout.add_widget(self.progress_bar)
+        self.status_label = Label(text="", halign='center'); self.status_label.bind(size=self.status_label.setter('text_size')); main_layout.add_widget(self.status_label)
+        buttons_layout = BoxLayout(size_hint_y=None, height='48dp', spacing=10)
+        self.start_btn = Button(text="Esporta", on_press=self.start_export); buttons_layout.add_widget(self.start_btn)
+        self.cancel_btn = Button(text="Chiudi", on_press=self.cancel_export); buttons_layout.add_widget(self.cancel_btn); main_layout.add_widget(buttons_layout)
+        self.content = main_layout; self.toggle_visibility(None, self.spinner_range.text)
+    def toggle_visibility(self, spinner, text):
+        if text == "Periodo": self.period_layout.height, self.period_layout.opacity, self.period_layout.disabled = '40dp', 1, False
+        else: self.period_layout.height, self.period_layout.opacity, self.period_layout.disabled = 0, 0, True
+    def _selected_range(self):
+        today = date.today(); text = self.spinner_range.text
+        if text == "Mese corrente": return today.replace(day=1), today.replace(day=calendar.monthrange(today.year, today.month)[1]), today.strftime('%Y-%m')
+        if text == "Anno corrente": return date(today.year, 1, 1), date(today.year, 12, 31), str(today.year)
+        if text == "Periodo":
+            start_date = datetime.strptime(self.start_date_input.text, "%d/%m/%Y").date(); end_date = datetime.strptime(self.end_date_input.text, "%d/%m/%Y").date()
+            if end_date < start_date: raise ValueError("periodo invertito")
+            return start_date, end_date, f"{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}"
+        return None, None, "Completo"
+    def start_export(self, instance):
+        if self.worker is not None and self.worker.is_alive(): return
+        try: start_date, end_date, label = self._selected_range()
+        except ValueError: self.status_label.text = "Date non valide (GG/MM/AAAA)."; return
+        file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), f"Report_Ore_{label}.xlsx")
+        # Gli anni mancanti si caricano qui, sul thread principale: il thread di lavoro legge solo questa copia
+        # (giornate comprese: la timbratura di oggi aggiorna il record mentre l'export è in corso)
+        self.app.engine.flush(); days = {date_str: day_data.copy() for date_str, day_data in self.app.engine.data.range_days(start_date, end_date).items()}
+        self.cancel_event.clear(); self.progress_bar.value = 0; self.start_btn.disabled = True; self.spinner_range.disabled = True
+        self.cancel_btn.text = "Annulla"; self.status_label.text = "Esportazione in corso..."
+        self.worker = threading.Thread(target=self._run_export, args=(days, start_date, end_date, file_path), daemon=True); self.worker.start()
+    def _run_export(self, days, start_date, end_date, file_path):
+        # Thread di lavoro: l'interfaccia viene aggiornata solo tramite Clock, mai direttamente
+        try:
+            report = ExcelReportGenerator(days, start_date, end_date)
+            completed = report.generate_report(file_path, progress_callback=self._report_progress, cancel_event=self.cancel_event)
+            message = f"Report salvato ({report.row_count} giorni) in:\n{file_path}" if completed else "Esportazione annullata."
+        except Exception as e: message = f"Errore: {e}"
+        Clock.schedule_once(lambda dt: self._export_finished(message))
+    def _report_progress(self, done, total): Clock.schedule_once(lambda dt: self._set_progress(done, total))
+    def _set_progress(self, done, total): self.progress_bar.max = total; self.progress_bar.value = done; self.status_label.text = f"Esportazione in corso... {done}/{total} giorni"
+    def _export_finished(self, message):
+        self.status_label.text = message; self.start_btn.disabled = False; self.spinner_range.disabled = False; self.cancel_btn.text = "Chiudi"
+    def cancel_export(self, instance):
+        if self.worker is not None and self.worker.is_alive(): self.cancel_event.set(); self.status_label.text = "Annullamento..."
+        else: self.dismiss()
+
+# --- CLASSE POPUP DI IMPORTAZIONE ---
+class ImportPopup(Popup):
+    CONFLICT_POLICIES = ["Mantieni esistenti", "Sostituisci esistenti"]
+    def __init__(self, app, **kwargs):
+        super().__init__(**kwargs); self.title = "Importa Timbrature Badge"; self.size_hint = (0.95, 0.8); self.auto_dismiss = False
+        self.app = app; self.cancel_event = threading.Event(); self.worker = None; self.importer = None; self.changed_days = {}
+        main_layout = BoxLayout(orientation='vertical', padding=10, spacing=10)
+        self.path_input = TextInput(hint_text="Percorso file CSV/XLSX", multiline=False, size_hint_y=None, height='40dp'); main_layout.add_widget(self.path_input)
+        policy_layout = BoxLayout(size_hint_y=None, height='40dp'); policy_layout.add_widget(Label(text="Giorni in conflitto:"))
+        self.spinner_policy = Spinner(text="Mantieni esistenti", values=self.CONFLICT_POLICIES); self.spinner_policy.bind(text=self.policy_changed); policy_layout.add_widget(self.spinner_policy); main_layout.add_widget(policy_layout)
+        self.status_label = Label(text="Colonne: data/ora in una colonna, oppure data e ora separate.", halign='left', valign='top'); self.status_label.bind(size=self.status_label.setter('text_size')); main_layout.add_widget(self.status_label)
+        buttons_layout = BoxLayout(size_hint_y=None, height='48dp', spacing=10)
+        self.analyse_btn = Button(text="Analizza", on_press=self.start_analysis); buttons_layout.add_widget(self.analyse_btn)
+        self.import_btn = Button(text="Importa", disabled=True, on_press=self.commit_import); buttons_layout.add_widget(self.import_btn)
+        self.cancel_btn = Button(text="Chiudi", on_press=self.cancel_analysis); buttons_layout.add_widget(self.cancel_btn); main_layout.add_widget(buttons_layout)
+        self.content = main_layout
+    def start_analysis(self, instance):
+        if self.worker is not None and self.worker.is_alive(): return
+        file_path = self.path_input.text.strip()
+        if not os.path.isfile(file_path): self.status_label.text = "File non trovato."; return
+        self.importer = BadgeImporter(file_path); self.changed_days = {}; self.cancel_event.clear()
+        self.analyse_btn.disabled = True; self.import_btn.disabled = True; self.cancel_btn.text = "Annulla"; self.status_label.text = "Analisi in corso..."
+        self.worker = threading.Thread(target=self._run_analysis, daemon=True); self.worker.start()
+    def _run_analysis(self):
+        # Thread di lavoro: lettura e calcoli pandas; il confronto con l'archivio resta sul thread principale
+        try: completed = self.importer.prepare(progress_callback=self._report_progress, cancel_event=self.cancel_event); message = "" if completed else "Analisi annullata."
+        except Exception as e: completed = False; message = f"Errore: {e}"
+        Clock.schedule_once(lambda dt: self._analysis_finished(completed, message))
+    def _report_progress(self, rows): Clock.schedule_once(lambda dt: setattr(self.status_label, 'text', f"Analisi in corso... {rows} righe lette"))
+    def _analysis_finished(self, completed, message):
+        self.analyse_btn.disabled = False; self.cancel_btn.text = "Chiudi"
+        if completed: self.refresh_plan()
+        else: self.status_label.text = message
+    def policy_changed(self, spinner, text):
+        if self.importer is not None and self.importer.days and not (self.worker is not None and self.worker.is_alive()): self.refresh_plan()
+    def refresh_plan(self):
+        overwrite = self.spinner_policy.text == "Sostituisci esistenti"; stats = self.importer.stats
+        self.changed_days, conflicts, unchanged = self.importer.plan(self.app.engine.data, overwrite=overwrite)
+        lines = [f"Righe lette: {stats['righe']} (non valide: {stats['non_valide']}, duplicate: {stats['duplicati']})",
+                 f"Giornate: {len(self.importer.days)} - da importare: {len(self.changed_days)}, già presenti: {unchanged}"]
+        if self.importer.odd_days: lines.append(f"Uscita mancante: {len(self.importer.odd_days)} giorni (es. {', '.join(self.importer.odd_days[:3])})")
+        if conflicts:
+            lines.append(f"Conflitti ({'sostituiti' if overwrite else 'saltati'}): {len(conflicts)}"); lines.extend(f"  {date_str}: {reason}" for date_str, reason in conflicts[:5])
+            if len(conflicts) > 5: lines.append("  ...")
+        self.status_label.text = "\n".join(lines); self.import_btn.disabled = not self.changed_days
+    def commit_import(self, instance):
+        imported = self.app.import_badge_days(self.changed_days); self.changed_days = {}; self.import_btn.disabled = True
+        self.status_label.text += f"\nImportate {imported} giornate."
+    def cancel_analysis(self, instance):
+        if self.worker is not None and self.worker.is_alive(): self.cancel_event.set(); self.status_label.text = "Annullamento..."
+        else: self.dismiss()
 
 # --- WIDGET CALENDARIO ---
 class CalendarWidget(GridLayout):
+    CELL_COUNT = 42
     def __init__(self, app, **kwargs):
-        super().__init__(**kwargs); self.cols = 7; self.app = app; self.current_date = datetime.now()
+        super().__init__(**kwargs); self.cols = 7; self.app = app; self.current_date = datetime.now(); self.day_cells = []; self.cell_by_day = {}
         self.build_calendar()
+    @INSTRUMENTS.timed("ui.build_calendar")
     def build_calendar(self):
-        self.clear_widgets(); header = BoxLayout(size_hint_y=None, height='48dp', spacing=10)
-        prev_btn = Button(text="<", size_hint_x=0.2, on_press=self.prev_month); self.month_label = Label(text=self.current_date.strftime("%B %Y").upper(), font_size='20sp', bold=True)
+        # Costruzione unica: al cambio mese le 42 celle vengono solo rietichettate e ricolorate
+        header = BoxLayout(size_hint_y=None, height='48dp', spacing=10)
+        prev_btn = Button(text="<", size_hint_x=0.2, on_press=self.prev_month); self.month_label = Label(text="", font_size='20sp', bold=True)
         next_btn = Button(text=">", size_hint_x=0.2, on_press=self.next_month); header.add_widget(prev_btn); header.add_widget(self.month_label); header.add_widget(next_btn); self.add_widget(header)
         days = ["Lun", "Mar", "Mer", "Gio", "Ven", "Sab", "Dom"]
         for day in days: self.add_widget(Label(text=day, bold=True, size_hint_y=None, height='30dp'))
-        month_calendar = calendar.monthcalendar(self.current_date.year, self.current_date.month)
-        for week in month_calendar:
-            for day_date in week:
-                if day_date == 0: self.add_widget(Label(text=""))
-                else:
-                    date_obj = date(self.current_date.year, self.current_date.month, day_date)
-                    day_data = self.app.data.get(date_obj.strftime("%Y-%m-%d"), {})
-                    day_type = day_data.get('tipo_giornata', None); day_btn = Button(text=str(day_date))
-                    if day_type == "Ferie" or day_type == "Festività": day_btn.background_color = (0.2, 0.6, 0.8, 1)
-                    elif day_type == "Malattia": day_btn.background_color = (0.8, 0.6, 0.2, 1)
-                    elif date_obj == date.today(): day_btn.background_color = (0.5, 0.5, 0.5, 1)
-                    day_btn.bind(on_press=self.day_pressed); self.add_widget(day_btn)
+        for _ in range(self.CELL_COUNT):
+            day_btn = Button(text=""); day_btn.bind(on_press=self.day_pressed); self.day_cells.append(day_btn); self.add_widget(day_btn)
+        self.refresh_month()
+    @INSTRUMENTS.timed("ui.refresh_month")
+    def refresh_month(self):
+        year, month = self.current_date.year, self.current_date.month; self.month_label.text = self.current_date.strftime("%B %Y").upper()
+        first_weekday, days_in_month = calendar.monthrange(year, month); month_types = self.app.engine.calendar_index.get_month(year, month)
+        today = date.today(); today_day = today.day if (today.year, today.month) == (year, month) else 0; self.cell_by_day = {}
+        for cell_idx, day_btn in enumerate(self.day_cells):
+            day = cell_idx - first_weekday + 1
+            if 1 <= day <= days_in_month:
+                day_btn.text = str(day); day_btn.opacity = 1; day_btn.disabled = False; self.cell_by_day[day] = day_btn
+                self._colour_cell(day_btn, month_types.get(day), day == today_day)
+            else: day_btn.text = ""; day_btn.opacity = 0; day_btn.disabled = True
+    def refresh_day(self, date_obj):
+        if (date_obj.year, date_obj.month) != (self.current_date.year, self.current_date.month): return
+        month_types = self.app.engine.calendar_index.get_month(date_obj.year, date_obj.month)
+        self._colour_cell(self.cell_by_day[date_obj.day], month_types.get(date_obj.day), date_obj == date.today())
+    def _colour_cell(self, day_btn, day_type, is_today):
+        if day_type == "Ferie" or day_type == "Festività": day_btn.background_color = (0.2, 0.6, 0.8, 1)
+        elif day_type == "Malattia": day_btn.background_color = (0.8, 0.6, 0.2, 1)
+        elif is_today: day_btn.background_color = (0.5, 0.5, 0.5, 1)
+        else: day_btn.background_color = (1, 1, 1, 1)
     def day_pressed(self, instance):
         day = int(instance.text); date_obj = date(self.current_date.year, self.current_date.month, day); self.app.open_planner_popup(date_obj)
-    def prev_month(self, instance): self.current_date = (self.current_date.replace(day=1) - timedelta(days=1)).replace(day=1); self.build_calendar()
+    def prev_month(self, instance): self.current_date = (self.current_date.replace(day=1) - timedelta(days=1)).replace(day=1); self.refresh_month()
     def next_month(self, instance):
-        last_day = calendar.monthrange(self.current_date.year, self.current_date.month)[1]; self.current_date = (self.current_date.replace(day=last_day) + timedelta(days=1)); self.build_calendar()
+        last_day = calendar.monthrange(self.current_date.year, self.current_date.month)[1]; self.current_date = (self.current_date.replace(day=last_day) + timedelta(days=1)); self.refresh_month()
+
+# --- AGGIORNAMENTO SCHERMATA OROLOGIO ---
+class RefreshScheduler:
+    # Un solo evento Clock alla volta, fissato al prossimo cambio di secondo (o di minuto quando
+    # l'orologio mostra solo HH:MM). Fermo se l'orologio non è visibile o se l'app è in pausa.
+    def __init__(self, callback): self.callback = callback; self.event = None; self.running = False; self.visible = False; self.foreground = True
+    def set_visible(self, visible): self.visible = visible; self.poke()
+    def set_foreground(self, foreground): self.foreground = foreground; self.poke()
+    def poke(self):
+        # Stato cambiato (timbratura, modifica, ritorno in primo piano): ridisegno subito e nuova scadenza.
+        # Se arriva dal callback stesso (cambio giorno) ci pensa il giro in corso.
+        if self.running: return
+        if self.event is not None: self.event.cancel(); self.event = None
+        if self.visible and self.foreground: self._run(0)
+    def _run(self, dt):
+        self.event = None; self.running = True
+        try: per_minute = self.callback(datetime.now())
+        finally: self.running = False
+        now = datetime.now(); delay = 1 - now.microsecond / 1000000
+        if per_minute: delay += 59 - now.second
+        if self.visible and self.foreground: self.event = Clock.schedule_once(self._run, delay + 0.005)
 
 # --- SCHERMATE ---
 class ClockScreen(Screen):
@@ -156,14 +243,25 @@ class ClockScreen(Screen):
         super().__init__(**kwargs); self.app = App.get_running_app(); layout = BoxLayout(orientation='vertical', padding=20, spacing=10)
         self.clock_label = Label(text="--:--:--", font_size='48sp', bold=True); layout.add_widget(self.clock_label)
         self.stamp_button = Button(text="Timbra", size_hint_y=None, height='60dp', font_size='20sp', on_press=self.app.timbra); layout.add_widget(self.stamp_button)
-        dashboard_layout = GridLayout(cols=2, size_hint_y=None, height='100dp')
+        dashboard_layout = GridLayout(cols=2, size_hint_y=None, height='200dp')
         dashboard_layout.add_widget(Label(text="Lavorato Oggi:", bold=True)); self.worked_today_label = Label(text="00:00:00"); dashboard_layout.add_widget(self.worked_today_label)
-        dashboard_layout.add_widget(Label(text="Debito/Credito:", bold=True)); self.balance_label = Label(text="--:--:--"); dashboard_layout.add_widget(self.balance_label); layout.add_widget(dashboard_layout)
+        dashboard_layout.add_widget(Label(text="Debito/Credito:", bold=True)); self.balance_label = Label(text="--:--:--"); dashboard_layout.add_widget(self.balance_label)
+        dashboard_layout.add_widget(Label(text="Saldo Settimana:", bold=True)); self.week_balance_label = Label(text="--:--:--"); dashboard_layout.add_widget(self.week_balance_label)
+        dashboard_layout.add_widget(Label(text="Saldo Mese:", bold=True)); self.month_balance_label = Label(text="--:--:--"); dashboard_layout.add_widget(self.month_balance_label)
+        dashboard_layout.add_widget(Label(text="Saldo Anno:", bold=True)); self.year_balance_label = Label(text="--:--:--"); dashboard_layout.add_widget(self.year_balance_label); layout.add_widget(dashboard_layout)
         self.stamps_list_label = Label(text="Nessuna timbratura.", size_hint_y=None, height='80dp', halign='center', valign='top'); self.stamps_list_label.bind(size=self.stamps_list_label.setter('text_size')); layout.add_widget(self.stamps_list_label)
-        switch_button = Button(text="Vai a Pianificazione >", size_hint_y=None, height='40dp', on_press=self.switch_to_planner); layout.add_widget(switch_button)
+        self.storage_label = Label(text="", font_size='12sp', color=(1, 0.3, 0.3, 1), size_hint_y=None, height='30dp', halign='center', valign='middle'); self.storage_label.bind(size=self.storage_label.setter('text_size')); layout.add_widget(self.storage_label)
+        switch_layout = BoxLayout(size_hint_y=None, height='40dp', spacing=10)
+        summary_button = Button(text="Riepilogo", on_press=self.switch_to_summary); switch_layout.add_widget(summary_button)
+        diagnostics_button = Button(text="Diagnostica", on_press=self.switch_to_diagnostics); switch_layout.add_widget(diagnostics_button)
+        switch_button = Button(text="Vai a Pianificazione >", on_press=self.switch_to_planner); switch_layout.add_widget(switch_button); layout.add_widget(switch_layout)
         footer = Label(text="realizzazione CRk969 - Dott. Roberto Calò", font_size='10sp', color=(0.7,0.7,0.7,1), size_hint_y=None, height='20dp'); layout.add_widget(footer)
         self.add_widget(layout)
-    def switch_to_planner(self, instance): self.manager.current = 'planner'
+    def on_enter(self, *args): self.app.refresh_scheduler.set_visible(True)
+    def on_leave(self, *args): self.app.refresh_scheduler.set_visible(False)
+    def switch_to_planner(self, instance): self.app.get_planner_screen(); self.manager.current = 'planner'
+    def switch_to_summary(self, instance): self.app.get_summary_screen(); self.manager.current = 'summary'
+    def switch_to_diagnostics(self, instance): self.app.get_diagnostics_screen(); self.manager.current = 'diagnostics'
 
 class PlannerScreen(Screen):
     def __init__(self, **kwargs):
@@ -179,6 +277,7 @@ class PlannerScreen(Screen):
         switch_button = Button(text="< Vai a Orologio", on_press=self.switch_to_clock); bottom_layout.add_widget(switch_button)
         help_button = Button(text="Guida (?)", on_press=self.show_help); bottom_layout.add_widget(help_button)
         export_button = Button(text="Esporta Report", on_press=self.app.export_to_excel); bottom_layout.add_widget(export_button)
+        import_button = Button(text="Importa Badge", on_press=self.app.open_import_popup); bottom_layout.add_widget(import_button)
         layout.add_widget(bottom_layout); self.add_widget(layout)
     def switch_to_clock(self, instance): self.manager.current = 'clock'
     def apply_period(self, instance):
@@ -189,66 +288,173 @@ class PlannerScreen(Screen):
             popup_content = BoxLayout(orientation='vertical', spacing=10); spinner = Spinner(text="Ferie", values=("Ferie", "Malattia")); popup_content.add_widget(spinner); confirm_btn = Button(text="Conferma")
             popup = Popup(title="Seleziona tipo di assenza", content=popup_content, size_hint=(0.6, 0.4))
             def confirm_action(btn_instance):
-                day_type = spinner.text; self.app.update_period_data(start_date, end_date, day_type); popup.dismiss(); self.calendar_widget.build_calendar()
+                day_type = spinner.text; self.app.update_period_data(start_date, end_date, day_type); popup.dismiss(); self.calendar_widget.refresh_month()
             confirm_btn.bind(on_press=confirm_action); popup.open()
         except ValueError: pass
     def show_help(self, instance):
         help_text = ("- Clicca su un giorno per pianificare turni o permessi orari.\n"
                      "- Usa i campi 'Dal'/'Al' per applicare Ferie/Malattia su più giorni.\n"
-                     "- L'export genera un file Excel nella cartella dell'app.")
+                     "- L'export genera un file Excel (mese, anno o periodo) nella cartella dell'app.\n"
+                     "- 'Importa Badge' unisce le timbrature di un file CSV/XLSX del lettore badge.")
         popup = Popup(title='Guida Pianificazione', content=Label(text=help_text, halign='center'), size_hint=(0.8, 0.4)); popup.open()
 
+class SummaryScreen(Screen):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs); self.app = App.get_running_app(); layout = BoxLayout(orientation='vertical', padding=10, spacing=10)
+        year_layout = BoxLayout(size_hint_y=None, height='40dp'); year_layout.add_widget(Label(text="Riepilogo anno:", bold=True))
+        self.spinner_year = Spinner(text=str(date.today().year), values=[]); self.spinner_year.bind(text=lambda spinner, text: self.refresh()); year_layout.add_widget(self.spinner_year); layout.add_widget(year_layout)
+        self.months_grid = GridLayout(cols=5, size_hint_y=None, row_default_height='30dp', row_force_default=True); self.months_grid.bind(minimum_height=self.months_grid.setter('height'))
+        scroll = ScrollView(); scroll.add_widget(self.months_grid); layout.add_widget(scroll)
+        self.absences_label = Label(text="", size_hint_y=None, height='50dp', halign='center', valign='middle'); self.absences_label.bind(size=self.absences_label.setter('text_size')); layout.add_widget(self.absences_label)
+        self.overtime_label = Label(text="", size_hint_y=None, height='50dp', halign='center', valign='middle'); self.overtime_label.bind(size=self.overtime_label.setter('text_size')); layout.add_widget(self.overtime_label)
+        switch_button = Button(text="< Vai a Orologio", size_hint_y=None, height='40dp', on_press=self.switch_to_clock); layout.add_widget(switch_button)
+        self.add_widget(layout)
+    def switch_to_clock(self, instance): self.manager.current = 'clock'
+    def on_pre_enter(self, *args): self.refresh()
+    def refresh(self):
+        self.app.engine.data.range_days()  # tutti gli anni in memoria: il riepilogo li elenca nel selettore
+        # Giorni futuri solo pianificati: fuori dai totali, come nei saldi dell'orologio
+        frame = AnalyticsEngine.until(self.app.engine.analytics.frame(), self.app.engine.today_str); years = sorted({str(year) for year in frame.index.year}, reverse=True) or [str(date.today().year)]
+        self.spinner_year.values = years
+        if self.spinner_year.text not in years: self.spinner_year.text = years[0]; return  # il cambio di testo richiama refresh
+        year = self.spinner_year.text; year_frame = frame[frame.index.year == int(year)]
+        self.months_grid.clear_widgets()
+        for header in ("Mese", "Lavorato", "Saldo", "Ingresso", "Uscita"): self.months_grid.add_widget(Label(text=header, bold=True))
+        if year_frame.empty: self.absences_label.text = "Nessun dato."; self.overtime_label.text = ""; return
+        months = AnalyticsEngine.period_totals(year_frame, "M"); totals = AnalyticsEngine.period_totals(year_frame, "Y")
+        for key, row in list(months.iterrows()) + [("Totale", totals.iloc[0])]:
+            self.months_grid.add_widget(Label(text=key, bold=key == "Totale")); self.months_grid.add_widget(Label(text=seconds_to_hms(row["lavorato_sec"])))
+            self.months_grid.add_widget(Label(text=seconds_to_hms(row["saldo_sec"], show_sign=True), color=(0.2, 1, 0.2, 1) if row["saldo_sec"] >= 0 else (1, 0.2, 0.2, 1)))
+            self.months_grid.add_widget(Label(text=AnalyticsEngine.format_time_of_day(row["ingresso_sec"]))); self.months_grid.add_widget(Label(text=AnalyticsEngine.format_time_of_day(row["uscita_sec"])))
+        absences = AnalyticsEngine.absences_by_type(year_frame).iloc[0]
+        absence_parts = [f"{day_type}: {int(count)} gg" for day_type, count in absences.items() if day_type != "ore_permesso" and count]
+        self.absences_label.text = "Assenze - " + " | ".join(absence_parts + [f"Ore permesso: {absences['ore_permesso']:.2f}"])
+        overtime = AnalyticsEngine.overtime_distribution(year_frame)
+        self.overtime_label.text = "Saldo giornaliero - " + (" | ".join(f"{band}: {int(overtime.iloc[0][band])}" for band in AnalyticsEngine.OVERTIME_BANDS) if not overtime.empty else "nessuna giornata lavorata")
+
+class DiagnosticsScreen(Screen):
+    DUMP_FILE = "chronos_diagnostics.json"
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs); self.app = App.get_running_app(); layout = BoxLayout(orientation='vertical', padding=10, spacing=10)
+        self.toggle_button = Button(size_hint_y=None, height='40dp', on_press=self.toggle); layout.add_widget(self.toggle_button)
+        self.timings_grid = GridLayout(cols=5, size_hint_y=None, row_default_height='30dp', row_force_default=True); self.timings_grid.bind(minimum_height=self.timings_grid.setter('height'))
+        scroll = ScrollView(); scroll.add_widget(self.timings_grid); layout.add_widget(scroll)
+        self.counters_label = Label(text="", size_hint_y=None, height='120dp', halign='center', valign='middle'); self.counters_label.bind(size=self.counters_label.setter('text_size')); layout.add_widget(self.counters_label)
+        buttons_layout = BoxLayout(size_hint_y=None, height='40dp', spacing=10)
+        buttons_layout.add_widget(Button(text="Aggiorna", on_press=lambda instance: self.refresh())); buttons_layout.add_widget(Button(text="Azzera", on_press=self.reset))
+        buttons_layout.add_widget(Button(text="Salva JSON", on_press=self.dump)); layout.add_widget(buttons_layout)
+        switch_button = Button(text="< Vai a Orologio", size_hint_y=None, height='40dp', on_press=self.switch_to_clock); layout.add_widget(switch_button)
+        self.add_widget(layout)
+    def switch_to_clock(self, instance): self.manager.current = 'clock'
+    def on_pre_enter(self, *args): self.refresh()
+    def toggle(self, instance): INSTRUMENTS.enabled = not INSTRUMENTS.enabled; self.refresh()
+    def reset(self, instance): INSTRUMENTS.reset(); self.refresh()
+    def dump(self, instance):
+        # Accanto ai report Excel: si recupera dal telefono come gli export
+        file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), self.DUMP_FILE)
+        try: self.counters_label.text = f"Salvato in:\n{INSTRUMENTS.dump(file_path, {'startup': self.app.startup_timings})}"
+        except OSError as e: self.counters_label.text = f"Errore salvataggio: {e}"
+    def refresh(self):
+        snapshot = INSTRUMENTS.snapshot()
+        self.toggle_button.text = "Strumentazione: ATTIVA (tocca per spegnere)" if snapshot["enabled"] else "Strumentazione: SPENTA (tocca per attivare)"
+        self.timings_grid.clear_widgets()
+        for header in ("Punto", "N", "p50 ms", "p95 ms", "max ms"): self.timings_grid.add_widget(Label(text=header, bold=True))
+        for name, stats in snapshot["timings"].items():
+            for text in (name, str(stats["n"]), f"{stats['p50_ms']:.1f}", f"{stats['p95_ms']:.1f}", f"{stats['max_ms']:.1f}"): self.timings_grid.add_widget(Label(text=text))
+        startup = " | ".join(f"{key}: {value * 1000:.0f} ms" for key, value in self.app.startup_timings.items() if key != "max_rss_kb")
+        counters = " | ".join(f"{name}: {value}" for name, value in snapshot["counters"].items() if not name.endswith(".calls"))
+        storage_error = self.app.engine.persistence_error(); storage = f"\n{storage_error}" if storage_error else ""
+        self.counters_label.text = f"Avvio - {startup}\n{counters or 'Nessun contatore registrato.'}{storage}"
+
 # --- APP PRINCIPALE ---
 class ChronosMobileApp(App):
-    CONFIG_FILE = "chronos_mobile_config.json"; DATA_FILE = "chronos_mobile_data.json"
+    CONFIG_FILE = "chronos_mobile_config.json"; DATA_FILE = "chronos_mobile_data.json"; DATA_DIR = "chronos_mobile_data"; JOURNAL_FILE = "chronos_mobile_data.journal"
     def build(self):
-        self.config = self._load_json(self.CONFIG_FILE, {"daily_target_hours": 8.5}); self.data = self._load_json(self.DATA_FILE, {})
-        self.sm = ScreenManager(transition=NoTransition()); self.clock_screen = ClockScreen(name='clock'); self.planner_screen = PlannerScreen(name='planner')
-        self.sm.add_widget(self.clock_screen); self.sm.add_widget(self.planner_screen)
-        self.reload_today_data(); Clock.schedule_interval(self.update, 1);
+        build_started = time.perf_counter(); self.startup_timings = {"import": _IMPORT_FINISHED - _IMPORT_STARTED}
+        self.config = self._load_json(self.CONFIG_FILE, {"daily_target_hours": 8.5})
+        self.engine = ChronosEngine(self.DATA_DIR, self.DATA_FILE, self.JOURNAL_FILE)
+        self.refresh_scheduler = RefreshScheduler(self.refresh_clock_screen); self._status_dirty = True
+        # Solo l'orologio prima del primo frame: pianificazione e calendario arrivano subito dopo
+        self.sm = ScreenManager(transition=NoTransition()); self.clock_screen = ClockScreen(name='clock'); self.planner_screen = None
+        self.summary_screen = None; self.diagnostics_screen = None; self.sm.add_widget(self.clock_screen)
+        self.update_ui_from_state(); self.refresh_scheduler.set_visible(True)
+        from kivy.core.window import Window
+        Window.bind(on_flip=self._on_first_frame)
+        self.startup_timings["build"] = time.perf_counter() - build_started
         return self.sm
-    def on_stop(self): self._log_day_data()
+    def _on_first_frame(self, window):
+        window.unbind(on_flip=self._on_first_frame); self.startup_timings["first_frame"] = time.perf_counter() - _IMPORT_STARTED
+        Clock.schedule_once(self._build_deferred_screens, 0)
+    def _build_deferred_screens(self, dt):
+        planner_started = time.perf_counter(); self.get_planner_screen(); self.startup_timings["planner"] = time.perf_counter() - planner_started
+        if os.environ.get("CHRONOS_PROFILE_STARTUP"):
+            # Modalità misura (benchmarks/startup.py): stampa i tempi ed esce
+            try:
+                import resource; self.startup_timings["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            except ImportError: pass
+            print("CHRONOS_STARTUP " + json.dumps(self.startup_timings), flush=True); self.stop()
+    def get_planner_screen(self):
+        if self.planner_screen is None: self.planner_screen = PlannerScreen(name='planner'); self.sm.add_widget(self.planner_screen)
+        return self.planner_screen
+    def get_summary_screen(self):
+        if self.summary_screen is None: self.summary_screen = SummaryScreen(name='summary'); self.sm.add_widget(self.summary_screen)
+        return self.summary_screen
+    def get_diagnostics_screen(self):
+        if self.diagnostics_screen is None: self.diagnostics_screen = DiagnosticsScreen(name='diagnostics'); self.sm.add_widget(self.diagnostics_screen)
+        return self.diagnostics_screen
+    def on_stop(self): self.engine.close()
+    def on_pause(self):
+        # Su Android un'app in pausa può essere chiusa senza on_stop: il registro va scritto adesso
+        self.refresh_scheduler.set_foreground(False); self.engine.flush(); return True
+    def on_resume(self): self.refresh_scheduler.set_foreground(True)
     def reload_today_data(self):
-        self.today_str = datetime.now().strftime("%Y-%m-%d")
-        self.today_data = self.data.get(self.today_str, self._get_default_day_data(self.today_str))
-        self.timestamps = [datetime.fromisoformat(ts) for ts in self.today_data.get("timbrature", [])]
-        self.update_ui_from_state()
+        self.engine.reload_today(); self.update_ui_from_state()
     def timbra(self, instance):
-        if self.timestamps and (datetime.now() - self.timestamps[-1]).total_seconds() < 1: return
-        self.timestamps.append(datetime.now()); self._log_day_data(); self.update_ui_from_state()
-    def update(self, dt):
-        self.clock_screen.clock_label.text = datetime.now().strftime("%H:%M:%S")
-        day_type = self.today_data.get('tipo_giornata', 'Lavorativo')
-        if day_type == "Lavorativo":
-            worked_seconds = self._calculate_worked_seconds(datetime.now())
-            target_seconds = self.today_data.get("obiettivo_ore", 8.5) * 3600
-            permit_seconds = self.today_data.get("ore_permesso", 0) * 3600
+        if self.engine.stamp(): self.update_ui_from_state()
+    def refresh_clock_screen(self, now):
+        # Restituisce True se basta un aggiornamento al minuto (giornata non lavorativa: orologio HH:MM)
+        if now.strftime("%Y-%m-%d") != self.engine.today_str: self.roll_over_day(now)
+        today_data = self.engine.today_data; day_type = today_data.tipo_giornata; working_day = day_type == "Lavorativo"
+        self._set_label(self.clock_screen.clock_label, now.strftime("%H:%M:%S" if working_day else "%H:%M"))
+        self._set_label(self.clock_screen.storage_label, self.engine.persistence_error() or "")
+        # Senza intervallo aperto lavorato e saldi restano fermi finché lo stato non cambia
+        if not (self._status_dirty or self.engine.is_working()): return not working_day
+        self._status_dirty = False
+        if working_day:
+            worked_seconds = self.engine.calculate_worked_seconds(now)
+            target_seconds = today_data.obiettivo_ore * 3600
+            permit_seconds = today_data.ore_permesso * 3600
             remaining_seconds = target_seconds - permit_seconds - worked_seconds
-            self.clock_screen.worked_today_label.text = self._seconds_to_hms(worked_seconds)
-            self.clock_screen.balance_label.text = self._seconds_to_hms(remaining_seconds)
-            self.clock_screen.balance_label.color = (1, 0.2, 0.2, 1) if remaining_seconds > 0 else (0.2, 1, 0.2, 1)
+            self._set_label(self.clock_screen.worked_today_label, seconds_to_hms(worked_seconds))
+            self._set_label(self.clock_screen.balance_label, seconds_to_hms(remaining_seconds), (1, 0.2, 0.2, 1) if remaining_seconds > 0 else (0.2, 1, 0.2, 1))
+            today_balance = worked_seconds + permit_seconds - target_seconds
         else:
-            self.clock_screen.worked_today_label.text = "00:00:00"; self.clock_screen.balance_label.text = day_type; self.clock_screen.balance_label.color = (0.2, 0.6, 0.8, 1)
-    def _is_working(self): return len(self.timestamps) % 2 != 0
+            self._set_label(self.clock_screen.worked_today_label, "00:00:00"); self._set_label(self.clock_screen.balance_label, day_type, (0.2, 0.6, 0.8, 1))
+            today_balance = BalanceIndex.day_balance_seconds(today_data)
+        labels = (self.clock_screen.week_balance_label, self.clock_screen.month_balance_label, self.clock_screen.year_balance_label)
+        for label, period_balance in zip(labels, self.engine.period_balances(today_balance)):
+            self._set_label(label, seconds_to_hms(period_balance, show_sign=True), (0.2, 1, 0.2, 1) if period_balance >= 0 else (1, 0.2, 0.2, 1))
+        return not working_day
+    def _set_label(self, label, text, color=None):
+        # Si tocca solo ciò che cambia davvero: ogni nuovo testo costa una texture
+        if label.text != text: label.text = text
+        if color is not None and tuple(label.color) != color: label.color = color
+    def roll_over_day(self, now):
+        # Mezzanotte passata (anche con l'app in pausa): chiude la giornata precedente e carica la nuova
+        self.engine.roll_over(now); self.update_ui_from_state()
+        if self.planner_screen is not None: self.planner_screen.calendar_widget.refresh_month()
     def update_ui_from_state(self):
-        if self.today_data.get('tipo_giornata', 'Lavorativo') != 'Lavorativo':
-            self.clock_screen.stamp_button.text = self.today_data['tipo_giornata']; self.clock_screen.stamp_button.disabled = True
+        self._status_dirty = True; self.refresh_scheduler.poke()
+        today_data = self.engine.today_data
+        if today_data.tipo_giornata != 'Lavorativo':
+            self.clock_screen.stamp_button.text = today_data.tipo_giornata; self.clock_screen.stamp_button.disabled = True
             self.clock_screen.stamps_list_label.text = "Nessuna timbratura per oggi."; return
         self.clock_screen.stamp_button.disabled = False
-        self.clock_screen.stamp_button.text = "Uscita / Pausa" if self._is_working() else "Ingresso / Rientro"
-        self.clock_screen.stamp_button.background_color = (0.8, 0.2, 0.2, 1) if self._is_working() else (0.2, 0.8, 0.2, 1)
-        stamps_text = [f"{'Ingresso/Rientro' if i % 2 == 0 else 'Uscita/Pausa'}: {ts.strftime('%H:%M:%S')}" for i, ts in enumerate(self.timestamps)]
+        self.clock_screen.stamp_button.text = "Uscita / Pausa" if self.engine.is_working() else "Ingresso / Rientro"
+        self.clock_screen.stamp_button.background_color = (0.8, 0.2, 0.2, 1) if self.engine.is_working() else (0.2, 0.8, 0.2, 1)
+        stamps_text = [f"{'Ingresso/Rientro' if i % 2 == 0 else 'Uscita/Pausa'}: {ts.strftime('%H:%M:%S')}" for i, ts in enumerate(self.engine.timestamps)]
         self.clock_screen.stamps_list_label.text = "\n".join(stamps_text) if stamps_text else "Nessuna timbratura."
-    def _calculate_worked_seconds(self, current_time):
-        total_seconds = 0; local_timestamps = self.timestamps[:]
-        if self._is_working(): local_timestamps.append(current_time)
-        for i in range(0, len(local_timestamps) - 1, 2): total_seconds += (local_timestamps[i+1] - local_timestamps[i]).total_seconds()
-        return total_seconds
-    def _log_day_data(self):
-        worked_seconds = self._calculate_worked_seconds(datetime.now())
-        self.today_data['timbrature'] = [ts.isoformat() for ts in self.timestamps]
-        self.today_data['ore_lavorate_sec'] = worked_seconds
-        self.data[self.today_str] = self.today_data; self._save_data()
+    @INSTRUMENTS.timed("app.load_json")
     def _load_json(self, file_path, default_data):
         if not os.path.exists(file_path):
             with open(file_path, 'w', encoding='utf-8') as f: json.dump(default_data, f, indent=4)
@@ -256,56 +462,29 @@ class ChronosMobileApp(App):
         try:
             with open(file_path, 'r', encoding='utf-8') as f: return json.load(f)
         except (json.JSONDecodeError, FileNotFoundError): return default_data
-    def _save_data(self):
-        with open(self.DATA_FILE, 'w', encoding='utf-8') as f: json.dump(dict(sorted(self.data.items())), f, indent=4)
-    def _seconds_to_hms(self, seconds, show_sign=False):
-        sign = "-" if seconds < 0 else "+" if show_sign else ""; seconds = int(abs(seconds))
-        h, rem = divmod(seconds, 3600); m, s = divmod(rem, 60); return f"{sign}{h:02}:{m:02}:{s:02}"
-    def calculate_hours_from_events(self, events_list):
-        total_minutes = 0
-        for start, end in events_list:
-            try: t_start = datetime.strptime(start, "%H:%M"); t_end = datetime.strptime(end, "%H:%M"); total_minutes += (t_end - t_start).total_seconds() / 60
-            except ValueError: return 0.0
-        return round(total_minutes / 60, 2)
     def open_planner_popup(self, date_obj):
         popup = PlannerPopup(app=self, date_obj=date_obj); popup.open()
-    def _get_default_day_data(self, date_str):
-        return {"tipo_giornata": "Lavorativo", "eventi_programmati": '[["08:30", "13:00"], ["14:00", "18:30"]]', "obiettivo_ore": 8.5, "timbrature": [], "ore_permesso": 0}
     def update_day_data(self, date_str, day_type, events_data, hours_text):
-        day_data = self.data.get(date_str, self._get_default_day_data(date_str))
-        day_data["tipo_giornata"] = day_type
-        if day_type == "Lavorativo":
-            if isinstance(events_data, str): events_data = json.loads(events_data)
-            day_data["eventi_programmati"] = json.dumps(events_data)
-            day_data["obiettivo_ore"] = self.calculate_hours_from_events(events_data); day_data["ore_permesso"] = 0
-        elif day_type in PlannerPopup.ABSENCE_TYPES_HOURLY:
-            day_data["ore_permesso"] = float(hours_text or 0)
-        else:
-            day_data["obiettivo_ore"] = 0; day_data["ore_permesso"] = 0
-        self.data[date_str] = day_data; self._save_data()
-        if date_str == self.today_str: self.reload_today_data()
+        self.engine.update_day_data(date_str, day_type, events_data, hours_text); self._status_dirty = True  # i saldi di periodo cambiano anche per altri giorni
+        if date_str == self.engine.today_str: self.update_ui_from_state()
     def update_period_data(self, start_date, end_date, day_type):
-        current_date = start_date
-        while current_date <= end_date:
-            if current_date.weekday() < 5:
-                date_str = current_date.strftime("%Y-%m-%d")
-                day_data = self.data.get(date_str, self._get_default_day_data(date_str))
-                day_data['tipo_giornata'] = day_type; day_data['ore_permesso'] = 0; day_data['obiettivo_ore'] = 0
-                self.data[date_str] = day_data
-            current_date += timedelta(days=1)
-        self._save_data()
-        if start_date <= date.today() <= end_date: self.reload_today_data()
+        changed_days = self.engine.update_period_data(start_date, end_date, day_type); self._status_dirty = True
+        if self.engine.today_str in changed_days: self.update_ui_from_state()
+    def open_import_popup(self, instance):
+        popup = ImportPopup(app=self); popup.open()
+    def import_badge_days(self, changed_days):
+        # Un solo salvataggio per l'intero file importato
+        self.engine.save_data(changed_days); self._status_dirty = True
+        if self.engine.today_str in changed_days: self.reload_today_data()
+        if self.planner_screen is not None: self.planner_screen.calendar_widget.refresh_month()
+        return len(changed_days)
     def export_to_excel(self, instance):
-        try:
-            if not self.data:
-                popup = Popup(title='Info', content=Label(text='Nessun dato da esportare.'), size_hint=(0.8, 0.4)); popup.open()
-                return
-            file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), f"Report_Ore_{datetime.now().strftime('%Y-%m')}.xlsx")
-            report = ExcelReportGenerator(self.data)
-            report.generate_report(file_path)
-            popup = Popup(title='Esportazione Completata', content=Label(text=f"Report salvato in:\n{file_path}", halign='center'), size_hint=(0.8, 0.4)); popup.open()
-        except Exception as e:
-            popup = Popup(title='Errore Esportazione', content=Label(text=f"Errore: {e}"), size_hint=(0.8, 0.4)); popup.open()
+        if self.engine.data.is_empty():
+            popup = Popup(title='Info', content=Label(text='Nessun dato da esportare.'), size_hint=(0.8, 0.4)); popup.open()
+            return
+        popup = ExportPopup(app=self); popup.open()
+
+_IMPORT_FINISHED = time.perf_counter()
 
 if __name__ == '__main__':
     ChronosMobileApp().run()
\ No newline at end of file